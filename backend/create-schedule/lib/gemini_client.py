@@ -1,6 +1,8 @@
 import re
+import json
 import logging
 from google import genai
+from google.genai import types
 
 from .secret_manager_client import get_gemini_api_key
 
@@ -10,9 +12,24 @@ get_gemini_api_key()
 client = genai.Client()
 model = "gemini-2.0-flash"
 
+ADDRESS_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"address": {"type": "STRING"}},
+    "required": ["address"],
+}
 
-def create_text(contents, model=model):
-    response = client.models.generate_content(model=model, contents=contents)
+
+def create_text(contents, model=model, response_schema=None):
+    """
+    :param response_schema: 指定すると JSON モードで呼び出し、応答をこのスキーマに沿わせる
+    """
+    config = None
+    if response_schema is not None:
+        config = types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=response_schema,
+        )
+    response = client.models.generate_content(model=model, contents=contents, config=config)
     return response
 
 
@@ -32,7 +49,13 @@ def infer_address_from_title_and_location(title: str, location: str) -> str:
 出力形式（JSONのみ）:
 """
     try:
-        response = create_text(prompt)
+        response = create_text(prompt, response_schema=ADDRESS_RESPONSE_SCHEMA)
+        try:
+            address = json.loads(response.text).get("address")
+            if address:
+                return address
+        except (json.JSONDecodeError, AttributeError):
+            pass
         match = re.search(r'{\s*"address"\s*:\s*"([^"]+)"\s*}', response.text)
         if match:
             return match.group(1)
@@ -14,6 +14,7 @@ from lib.http_utils import parse_json_body, respond
 from lib.logger_setup import configure_logger
 from lib.validators import validate_and_convert_event_data
 from lib.firestore_utils import serialize_firestore_dict
+from lib.weather_format import decode_weather_info
 from lib.gemini_client import infer_address_from_title_and_location
 from lib.exceptions import ValidationError
 
@@ -41,6 +42,9 @@ class RequestHandler(BaseHTTPRequestHandler):
                 respond(self, 404, {"error": "event not found"})
                 return
             event = {"id": doc.id, **serialize_firestore_dict(doc.to_dict())}
+            # アプリは OpenWeatherMap 形式の weather_info を読むため、列指向の保存形式から戻す
+            if event.get("weather_info"):
+                event["weather_info"] = decode_weather_info(event["weather_info"])
 
             # チェックリストを取得
             checklist_ref = get_event_checklist_collection(db, user_id, event_id)
@@ -1,41 +1,87 @@
 from datetime import datetime, timedelta, timezone
 import logging
 
+from generate_item import generate_item_per_record
+from lib.batch_checkpoint import run_resumable_batch
+from lib.checklist_template_cache import get_template_cache_stats
 from lib.firestore_client import (
     get_firestore_client,
     get_query_with_and_filters,
 )
+from lib.gemini_client import get_json_parse_stats
+from lib.sharding import is_in_shard
+from lib.worker_pool import run_with_worker_pool
 
 logger = logging.getLogger()
 
+JST = timezone(timedelta(hours=9))
+DAY_OFFSETS = [0, 2, 4]
 
-def _get_records_for_day_offset(collection_name: str, offset_days: int):
-    JST = timezone(timedelta(hours=9))
-    today = datetime.now(JST).replace(hour=0, minute=0, second=0, microsecond=0)
-    target_day = today + timedelta(days=offset_days)
-    start = target_day
-    end = target_day + timedelta(days=1)
 
-    db = get_firestore_client("hisho-events")
+def _get_records_query(db, today: datetime):
+    # 0〜4日後の範囲を1クエリで取得し、ページングのため start_time 順に並べる
+    start = today + timedelta(days=min(DAY_OFFSETS))
+    end = today + timedelta(days=max(DAY_OFFSETS) + 1)
 
     filters = [
         ("start_time", ">=", start),
         ("start_time", "<", end),
     ]
 
-    query = get_query_with_and_filters(db.collection_group(collection_name), filters)
+    query = get_query_with_and_filters(db.collection_group("events"), filters)
+    return query.order_by("start_time")
+
 
-    return list(query.stream())
+def run_daily_batch(shard_index: int = 0, shard_count: int = 1):
+    """
+    0/2/4 日後に開始するイベントをページ単位で処理する。途中で止まっても再実行で続きから再開する。
+    shard_count > 1 の場合は、ユーザーIDのハッシュが shard_index に当たるイベントのみ処理する。
+    :return: {"status": "done" | "in_progress", "pages", "records",
+              "events": 今回のリクエストで処理したイベントの
+                  {"processed", "skipped", "failed", "timed_out", "initial", "template", "changed", "unchanged"}}
+    """
+    today = datetime.now(JST).replace(hour=0, minute=0, second=0, microsecond=0)
+    target_dates = {(today + timedelta(days=offset)).date() for offset in DAY_OFFSETS}
+
+    db = get_firestore_client("hisho-events")
+    event_stats = {
+        "processed": 0,
+        "skipped": 0,
+        "failed": 0,
+        "timed_out": 0,
+        "initial": 0,
+        "template": 0,
+        "changed": 0,
+        "unchanged": 0,
+    }
 
+    def handle_page(snapshots):
+        # 1日後・3日後のイベントと他シャードのイベントはクライアント側で除外する
+        records = [
+            snapshot
+            for snapshot in snapshots
+            if snapshot.get("start_time").astimezone(JST).date() in target_dates
+            and is_in_shard(snapshot.reference.parent.parent.id, shard_index, shard_count)
+        ]
+        logger.info(f"--- {DAY_OFFSETS}日後のレコード: {len(records)} 件 ---")
+        # 1件の失敗・遅延でページ全体が止まらないよう、イベントごとに独立して処理する
+        page_stats = run_with_worker_pool(records, _generate_for_event)
+        logger.info(f"持ち物生成: {page_stats}")
+        logger.info(f"持ち物テンプレートキャッシュ: {get_template_cache_stats()}")
+        logger.info(f"Gemini応答のJSON解析: {get_json_parse_stats()}")
+        for key, value in page_stats.items():
+            event_stats[key] = event_stats.get(key, 0) + value
 
-def get_all_records():
-    collection_name = "events"
-    offsets = [0, 2, 4]
-    all_records = []
+    result = run_resumable_batch(
+        db,
+        f"generate-checklist_{shard_index}of{shard_count}",
+        today.date().isoformat(),
+        _get_records_query(db, today),
+        handle_page,
+    )
+    return {**result, "events": event_stats}
 
-    for offset in offsets:
-        records = _get_records_for_day_offset(collection_name, offset)
-        logger.info(f"--- {offset}日後のレコード ---")
-        all_records.extend(records)
 
-    return all_records
+def _generate_for_event(snapshot, deadline: float):
+    # 生成・再生成・スキップの判定をそれぞれ数える
+    return {generate_item_per_record(snapshot, deadline): 1}
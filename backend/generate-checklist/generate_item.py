@@ -1,47 +1,88 @@
+from lib.checklist_template_cache import build_event_signature, get_template, save_template
+from lib.firestore_client import get_firestore_client
 from lib.gemini_client import generate_checklist_items
+from lib.regeneration_policy import compute_checklist_fingerprint, decide_regeneration
+from lib.weather_summary import get_weather_text
 from datetime import timedelta, timezone, datetime
+import logging
+import time
 
+logger = logging.getLogger()
+db = get_firestore_client("hisho-events")
 
-def generate_item_per_record(event_ref):
-    event_doc = event_ref.get()
+
+def generate_item_per_record(event_doc, deadline: float = None):
+    """
+    クエリや get() で取得済みのイベントのスナップショットから持ち物を生成し、
+    持ち物と next_check_due を1つの WriteBatch でまとめて保存する。
+    前回生成時から指紋（タイトル・場所・開始日時・天気）が変わっていなければ Gemini を呼ばない。
+    持ち物がまだないイベントは、似たイベントの持ち物テンプレートがあればそれを使う。
+    :param deadline: time.monotonic() の期限。過ぎていたら書き込まずに TimeoutError にする
+    :return: 判定結果 "initial" / "template" / "changed" / "unchanged"
+    """
     event = event_doc.to_dict()
     datetime = event.get("start_time", "")
     location = event.get("location", "")
     description = event.get("title", "")
 
-    checklist_ref = event_ref.collection("checklists")
-    weather_info = event.get("weather_info")
+    checklist_ref = event_doc.reference.collection("checklists")
+    weather_info = get_weather_text(event)
 
     docs = list(checklist_ref.stream())
 
+    fingerprint = compute_checklist_fingerprint(event)
+    decision = decide_regeneration(event, bool(docs), fingerprint)
+    logger.info(f"{event_doc.id} の持ち物生成判定: {decision}")
+    if decision == "unchanged":
+        return decision
+
     if not docs:
-        result = generate_checklist_items(
-            datetime, location, description, weather_info=weather_info
-        )
+        # 似たイベントのテンプレートがあれば Gemini を呼ばずにそれを使う
+        signature = build_event_signature(event)
+        result = get_template(signature)
+        if result is not None:
+            decision = "template"
+            logger.info(f"{event_doc.id} は持ち物テンプレートから生成: {signature}")
+        else:
+            result = generate_checklist_items(
+                datetime, location, description, weather_info=weather_info
+            )
+            save_template(signature, result)
     else:
         items = [doc.to_dict().get("item") for doc in docs if "item" in doc.to_dict()]
         result = generate_checklist_items(
             datetime, location, description, items, weather_info
         )
 
+    batch = db.batch()
     for category in ["required", "optional"]:
         for item in result.get(category, []):
-            checklist_ref.document().set(
+            batch.set(
+                checklist_ref.document(),
                 {
                     "item": item.get("item"),
                     "prepare_before": item.get("prepare_before", 0),
                     "required": category == "required",
                     "checked": False,
-                }
+                },
             )
+    # events に反映（持ち物の追加と同時にコミットする）
+    event_update = {"next_check_due": _get_next_check_due(event_doc, result)}
+    # 初回で何も生成できなかった場合は、次回もう一度生成させるため指紋を残さない
+    if docs or result.get("required") or result.get("optional"):
+        event_update["checklist_fingerprint"] = fingerprint
+    batch.update(event_doc.reference, event_update)
+    # 呼び出し元がタイムアウト扱いにしたイベントは書き込まない
+    if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutError(f"{event_doc.id} は期限を過ぎたため持ち物を保存しません")
+    batch.commit()
 
-    return result
-
+    return decision
 
-def update_next_check_due(event_ref, result):
 
-    event = event_ref.get().to_dict()
-    event_start = event.get("start_time")
+def _get_next_check_due(event_doc, result):
+    # start_time は取得済みのスナップショットから読み、イベントを再取得しない
+    event_start = event_doc.get("start_time")
     soonest_due = None
 
     for category in ["required", "optional"]:
@@ -50,5 +91,4 @@ def update_next_check_due(event_ref, result):
             if soonest_due is None or due < soonest_due:
                 soonest_due = due
 
-    # events に反映
-    event_ref.update({"next_check_due": soonest_due})
+    return soonest_due
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta, timezone
+
+from .firestore_client import get_firestore_client
+from .regeneration_policy import RAIN_POP_THRESHOLD
+from .weather_summary import JST, get_weather_summary
+
+logger = logging.getLogger()
+
+CHECKLIST_TEMPLATE_COLLECTION = "checklist_templates"
+# 0 以下ならテンプレートキャッシュを使わない
+CHECKLIST_TEMPLATE_TTL_DAYS = int(os.environ.get("CHECKLIST_TEMPLATE_TTL_DAYS", 14))
+PREFECTURE_PATTERN = re.compile(r"(北海道|東京都|京都府|大阪府|[^\s\d、,]{2,3}県)")
+
+db = get_firestore_client("hisho-events")
+
+_lock = threading.Lock()
+_stats = {"hit": 0, "miss": 0}
+
+
+def build_event_signature(event: dict) -> dict:
+    """
+    似たイベントが同じ持ち物になるよう、タイトルの語・住所の都道府県・天気の区分に正規化する
+    """
+    return {
+        "title_tokens": _title_tokens(event.get("title") or ""),
+        "prefecture": _prefecture(event.get("address") or ""),
+        "weather": _weather_bucket(event),
+    }
+
+
+def get_template(signature: dict):
+    """
+    :return: 有効期限内のテンプレート {"required": [...], "optional": [...]}。なければ None
+    """
+    if CHECKLIST_TEMPLATE_TTL_DAYS <= 0:
+        return None
+
+    try:
+        doc = _template_doc(signature).get()
+    except Exception as e:
+        logger.warning(f"持ち物テンプレートの読み込みに失敗: {e}")
+        doc = None
+
+    data = doc.to_dict() if doc is not None and doc.exists else None
+    if not data or data["expire_at"] <= datetime.now(timezone.utc):
+        _count("miss")
+        return None
+
+    _count("hit")
+    return {"required": data["required"], "optional": data["optional"]}
+
+
+def save_template(signature: dict, result: dict):
+    if CHECKLIST_TEMPLATE_TTL_DAYS <= 0:
+        return
+    if not (result.get("required") or result.get("optional")):
+        return
+
+    now = datetime.now(timezone.utc)
+    try:
+        _template_doc(signature).set(
+            {
+                "signature": signature,
+                "required": result.get("required", []),
+                "optional": result.get("optional", []),
+                "cached_at": now,
+                # Firestore の TTL ポリシー対象フィールド
+                "expire_at": now + timedelta(days=CHECKLIST_TEMPLATE_TTL_DAYS),
+            }
+        )
+    except Exception as e:
+        logger.warning(f"持ち物テンプレートの保存に失敗: {e}")
+
+
+def get_template_cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+    total = stats["hit"] + stats["miss"]
+    stats["hit_rate"] = round(stats["hit"] / total, 3) if total else None
+    return stats
+
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+
+
+def _template_doc(signature: dict):
+    key = json.dumps(signature, ensure_ascii=False, sort_keys=True)
+    doc_id = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return db.collection(CHECKLIST_TEMPLATE_COLLECTION).document(doc_id)
+
+
+def _title_tokens(title: str) -> list[str]:
+    # 全角/半角・大小文字の揺れを吸収し、回数や日付など数字を含む語は除く
+    normalized = unicodedata.normalize("NFKC", title).lower()
+    tokens = {
+        token
+        for token in re.split(r"[\W_]+", normalized)
+        if token and not re.search(r"\d", token)
+    }
+    return sorted(tokens)
+
+
+def _prefecture(address: str):
+    match = PREFECTURE_PATTERN.search(unicodedata.normalize("NFKC", address))
+    return match.group(1) if match else None
+
+
+def _weather_bucket(event: dict):
+    summary = get_weather_summary(event)
+    if not summary:
+        return None
+
+    # イベント当日の要約を優先し、なければ先頭の日を使う
+    start_time = event.get("start_time")
+    event_date = start_time.astimezone(JST).date().isoformat() if start_time else None
+    day = next((d for d in summary if d.get("date") == event_date), summary[0])
+
+    temp_max = day.get("temp_max")
+    if temp_max is None:
+        temperature = None
+    elif temp_max >= 28:
+        temperature = "hot"
+    elif temp_max < 10:
+        temperature = "cold"
+    else:
+        temperature = "mild"
+    rain = (day.get("pop_max") or 0) >= RAIN_POP_THRESHOLD
+    return f"{temperature}_{'rain' if rain else 'dry'}"
@@ -2,32 +2,122 @@ import os
 import json
 import re
 import logging
+import threading
 from google import genai
+from google.genai import types
 
 from .secret_manager_client import get_gemini_api_key
 
 logger = logging.getLogger(__name__)
 
+GEMINI_TIMEOUT_SECONDS = int(os.environ.get("GEMINI_TIMEOUT_SECONDS", 30))
+
 get_gemini_api_key()
-client = genai.Client()
+# 応答しないリクエストでワーカーが塞がらないよう、HTTP レベルのタイムアウトを設定する
+client = genai.Client(
+    http_options=types.HttpOptions(timeout=GEMINI_TIMEOUT_SECONDS * 1000)
+)
 model = "gemini-2.0-flash"
 
-
-def create_text(contents, model=model):
-    response = client.models.generate_content(model=model, contents=contents)
+_CHECKLIST_ITEMS_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "item": {"type": "STRING"},
+            "prepare_before": {"type": "INTEGER"},
+        },
+        "required": ["item", "prepare_before"],
+    },
+}
+CHECKLIST_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "required": _CHECKLIST_ITEMS_SCHEMA,
+        "optional": _CHECKLIST_ITEMS_SCHEMA,
+    },
+    "required": ["required", "optional"],
+}
+
+_json_stats = {"direct": 0, "fallback": 0, "failed": 0}
+_json_stats_lock = threading.Lock()
+
+
+class GeminiResponseError(ValueError):
+    """Gemini の応答から JSON を取り出せなかった"""
+
+
+def create_text(contents, model=model, response_schema=None):
+    """
+    :param response_schema: 指定すると JSON モードで呼び出し、応答をこのスキーマに沿わせる
+    """
+    config = None
+    if response_schema is not None:
+        config = types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=response_schema,
+        )
+    response = client.models.generate_content(model=model, contents=contents, config=config)
     return response
 
 
-def extract_json(text: str) -> dict:
-    match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL)
-    if not match:
-        match = re.search(r"(\{.*?\})", text, re.DOTALL)
-    if match:
-        try:
-            return json.loads(match.group(1))
-        except json.JSONDecodeError as e:
-            logger.warning(f"JSONデコード失敗: {e}")
-    return {"required": [], "optional": []}
+def extract_json(text: str, is_valid=None):
+    """
+    JSON モードの応答はそのまま json.loads し、JSON として読めない場合のみコードブロックや
+    前後の説明文を除いて最初の JSON オブジェクトを読む。
+    :param is_valid: 取り出した値の形を検証する関数（省略時は dict であること）
+    :return: 取り出した値。取り出せないか形が違えば None
+    """
+    text = (text or "").strip()
+    try:
+        result = json.loads(text)
+        source = "direct"
+    except json.JSONDecodeError:
+        result = _extract_embedded_json(text)
+        source = "fallback"
+
+    if result is not None and (is_valid or _is_object)(result):
+        _count_json(source)
+        return result
+
+    logger.warning(f"Geminiの応答が期待したJSONの形ではありません: {text[:200]}")
+    _count_json("failed")
+    return None
+
+
+def _extract_embedded_json(text: str):
+    match = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    candidate = match.group(1) if match else text
+    start = candidate.find("{")
+    if start < 0:
+        return None
+    try:
+        # raw_decode は入れ子の JSON も末尾まで正しく読む
+        result, _ = json.JSONDecoder().raw_decode(candidate[start:])
+        return result
+    except json.JSONDecodeError as e:
+        logger.warning(f"JSONデコード失敗: {e}")
+        return None
+
+
+def _is_object(value) -> bool:
+    return isinstance(value, dict)
+
+
+def _is_checklist(value) -> bool:
+    return isinstance(value, dict) and all(
+        isinstance(value.get(category), list) for category in ("required", "optional")
+    )
+
+
+def get_json_parse_stats() -> dict:
+    with _json_stats_lock:
+        return dict(_json_stats)
+
+
+def _count_json(name: str):
+    with _json_stats_lock:
+        _json_stats[name] += 1
 
 
 def generate_checklist_items(
@@ -45,6 +135,7 @@ def generate_checklist_items(
     :param existing_items: すでにある持ち物名のリスト（省略可）
     :param is_initial: 初回生成ならTrue、追加生成ならFalse
     :return: {"required": [...], "optional": [...]}
+    :raises GeminiResponseError: 応答から JSON を取り出せなかった場合
     """
     existing_items = existing_items or []
     is_initial = not existing_items
@@ -85,6 +176,10 @@ def generate_checklist_items(
 内容: {description}
 """
 
-    response = create_text(prompt)
+    response = create_text(prompt, response_schema=CHECKLIST_RESPONSE_SCHEMA)
     logger.info(f"Gemini応答: {response.text}")
-    return extract_json(response.text)
+    result = extract_json(response.text, is_valid=_is_checklist)
+    if result is None:
+        # 空の持ち物として保存すると次回また生成し直すことになるため、失敗として扱う
+        raise GeminiResponseError("Geminiの応答から持ち物のJSONを取り出せませんでした")
+    return result
@@ -0,0 +1,53 @@
+import hashlib
+import json
+
+from .weather_summary import get_weather_summary
+
+# 指紋の計算方法を変えたら上げる（保存済みの指紋をすべて無効にするため）
+CHECKLIST_FINGERPRINT_VERSION = 1
+# 気温はこの幅で丸める（予報の小さな揺れで再生成しないため）
+TEMP_BUCKET_DEGREES = 5
+# 降水確率がこれ以上なら「雨」とみなす
+RAIN_POP_THRESHOLD = 0.5
+
+
+def compute_checklist_fingerprint(event: dict) -> str:
+    """
+    持ち物の内容を左右する項目（タイトル・場所・開始日時・天気）から指紋を作る。
+    天気は日ごとの天気・気温帯・雨の有無に丸めて含める。
+    """
+    start_time = event.get("start_time")
+    payload = {
+        "version": CHECKLIST_FINGERPRINT_VERSION,
+        "title": event.get("title"),
+        "location": event.get("location"),
+        "start_time": start_time.isoformat() if start_time else None,
+        "weather": [_weather_key(day) for day in get_weather_summary(event)],
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def decide_regeneration(event: dict, has_items: bool, fingerprint: str) -> str:
+    """
+    :return: "initial"（持ち物がまだない）/ "changed"（指紋が変わった）/ "unchanged"（Gemini を呼ばない）
+    """
+    if not has_items:
+        return "initial"
+    if event.get("checklist_fingerprint") != fingerprint:
+        return "changed"
+    return "unchanged"
+
+
+def _weather_key(day: dict) -> dict:
+    return {
+        "date": day.get("date"),
+        "condition": day.get("condition"),
+        "temp_min": _bucket(day.get("temp_min")),
+        "temp_max": _bucket(day.get("temp_max")),
+        "rain": (day.get("pop_max") or 0) >= RAIN_POP_THRESHOLD,
+    }
+
+
+def _bucket(temp):
+    return None if temp is None else int(temp // TEMP_BUCKET_DEGREES) * TEMP_BUCKET_DEGREES
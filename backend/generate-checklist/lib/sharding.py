@@ -0,0 +1,29 @@
+import json
+import zlib
+
+
+def parse_shard_params(body: str):
+    """
+    PUT ボディの {"shard_index": i, "shard_count": n} を読み取る。省略時は 0/1（分割なし）。
+
+    Raises:
+        ValueError: JSON オブジェクトでない、または値が整数でない・範囲外の場合。
+    """
+    data = json.loads(body) if body else {}
+    if not isinstance(data, dict):
+        raise ValueError("PUT ボディは JSON オブジェクトで指定してください")
+    try:
+        shard_index = int(data.get("shard_index", 0))
+        shard_count = int(data.get("shard_count", 1))
+    except TypeError:
+        raise ValueError(f"不正なシャード指定です: {data}")
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError(f"不正なシャード指定です: {shard_index}/{shard_count}")
+    return shard_index, shard_count
+
+
+def is_in_shard(user_id: str, shard_index: int, shard_count: int) -> bool:
+    # hash() はプロセスごとに値が変わるため、インスタンス間で安定した crc32 を使う。
+    # シャードはクエリ結果をクライアント側で振り分けるもので、読み取り件数は減らない
+    # （分割したいのは Gemini / 天気 API の呼び出しで、イベントの読み取りは安い）
+    return zlib.crc32(user_id.encode("utf-8")) % shard_count == shard_index
@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+
+# weather_info を OpenWeatherMap のレスポンスそのままではなく、列ごとの配列で保存する形式
+WEATHER_INFO_FORMAT = "columnar_v1"
+CITY_FIELDS = ("name", "country", "coord", "timezone", "sunrise", "sunset")
+
+
+def encode_weather_info(forecast: dict) -> dict:
+    """
+    OpenWeatherMap の予報（{"city", "list"}）を列指向のコンパクトな形式にする。
+    天気の説明文は condition code ごとに1度だけ conditions に持つ。
+    :return: {"format", "city", "dt", "temp", "pop", "wind", "weather_id", "conditions"}
+    """
+    forecast = forecast or {}
+    city = forecast.get("city") or {}
+    columns = {"dt": [], "temp": [], "pop": [], "wind": [], "weather_id": []}
+    conditions = {}
+
+    for entry in forecast.get("list", []):
+        if "dt" not in entry:
+            continue
+        weather = (entry.get("weather") or [{}])[0]
+        weather_id = weather.get("id")
+        columns["dt"].append(entry["dt"])
+        columns["temp"].append(entry.get("main", {}).get("temp"))
+        columns["pop"].append(entry.get("pop", 0))
+        columns["wind"].append(entry.get("wind", {}).get("speed"))
+        columns["weather_id"].append(weather_id)
+        if weather_id is not None:
+            # Firestore のマップのキーは文字列のみ
+            conditions.setdefault(
+                str(weather_id),
+                {"main": weather.get("main"), "description": weather.get("description")},
+            )
+
+    return {
+        "format": WEATHER_INFO_FORMAT,
+        "city": {key: city[key] for key in CITY_FIELDS if key in city},
+        **columns,
+        "conditions": conditions,
+    }
+
+
+def decode_weather_info(info: dict) -> dict:
+    """
+    weather_info を OpenWeatherMap と同じ {"city", "list"} の形に戻す。
+    復元されるのは保存している項目（dt, dt_txt, main.temp, weather[0] の id/main/description,
+    pop, wind.speed）のみで、temp_min/temp_max・humidity・feels_like・icon・clouds・visibility などは含まない。
+    移行前の形式（list を持つもの）はそのまま返す。
+    """
+    if not is_compact_weather_info(info):
+        return info
+
+    conditions = info.get("conditions", {})
+    entries = []
+    for dt, temp, pop, wind, weather_id in zip(
+        info["dt"], info["temp"], info["pop"], info["wind"], info["weather_id"]
+    ):
+        condition = conditions.get(str(weather_id), {})
+        entries.append(
+            {
+                "dt": dt,
+                "dt_txt": datetime.fromtimestamp(dt, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                "main": {"temp": temp},
+                "weather": [
+                    {
+                        "id": weather_id,
+                        "main": condition.get("main"),
+                        "description": condition.get("description"),
+                    }
+                ],
+                "pop": pop,
+                "wind": {"speed": wind},
+            }
+        )
+    return {"city": info.get("city", {}), "list": entries}
+
+
+def is_compact_weather_info(info) -> bool:
+    return isinstance(info, dict) and info.get("format") == WEATHER_INFO_FORMAT
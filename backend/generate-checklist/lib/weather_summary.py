@@ -0,0 +1,82 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from .weather_format import decode_weather_info
+
+JST = timezone(timedelta(hours=9))
+
+
+def summarize_forecast(forecast: dict) -> list[dict]:
+    """
+    OpenWeatherMap の3時間ごとの予報を、日（JST）ごとのコンパクトな要約にする。
+    :return: [{"date", "temp_min", "temp_max", "pop_max", "wind_max", "condition"}]
+    """
+    days = {}
+    for entry in (forecast or {}).get("list", []):
+        if "dt" not in entry:
+            continue
+        date = datetime.fromtimestamp(entry["dt"], JST).date().isoformat()
+        main = entry.get("main", {})
+        weather = entry.get("weather") or [{}]
+        temp = main.get("temp")
+
+        day = days.setdefault(
+            date,
+            {"temp_min": None, "temp_max": None, "pop_max": 0, "wind_max": 0, "conditions": Counter()},
+        )
+        temp_min = main.get("temp_min", temp)
+        temp_max = main.get("temp_max", temp)
+        if temp_min is not None and (day["temp_min"] is None or temp_min < day["temp_min"]):
+            day["temp_min"] = temp_min
+        if temp_max is not None and (day["temp_max"] is None or temp_max > day["temp_max"]):
+            day["temp_max"] = temp_max
+        day["pop_max"] = max(day["pop_max"], entry.get("pop", 0))
+        day["wind_max"] = max(day["wind_max"], entry.get("wind", {}).get("speed", 0))
+        condition = weather[0].get("description") or weather[0].get("main")
+        if condition:
+            day["conditions"][condition] += 1
+
+    return [
+        {
+            "date": date,
+            "temp_min": _round(day["temp_min"]),
+            "temp_max": _round(day["temp_max"]),
+            "pop_max": round(day["pop_max"], 2),
+            "wind_max": _round(day["wind_max"]),
+            "condition": day["conditions"].most_common(1)[0][0] if day["conditions"] else None,
+        }
+        for date, day in sorted(days.items())
+    ]
+
+
+def format_weather_summary(summary: list[dict]) -> str:
+    """
+    プロンプトに埋め込むための短いテキストにする
+    """
+    return "\n".join(
+        f"{day['date']}: {day['condition'] or '不明'}、"
+        f"気温 {day['temp_min']}〜{day['temp_max']}℃、"
+        f"降水確率 最大{round(day['pop_max'] * 100)}%、"
+        f"風速 最大{day['wind_max']}m/s"
+        for day in summary
+    )
+
+
+def get_weather_summary(event: dict) -> list[dict]:
+    """
+    イベントの weather_summary（なければ weather_info から要約）を返す
+    """
+    return event.get("weather_summary") or summarize_forecast(
+        decode_weather_info(event.get("weather_info"))
+    )
+
+
+def get_weather_text(event: dict) -> str:
+    """
+    イベントの天気の要約をプロンプト用テキストで返す
+    """
+    return format_weather_summary(get_weather_summary(event))
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
@@ -0,0 +1,81 @@
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger()
+
+# 同時に持ち物を生成するイベント数（Gemini の同時リクエスト数）
+CHECKLIST_MAX_WORKERS = int(os.environ.get("CHECKLIST_MAX_WORKERS", 8))
+# 1イベントの処理にかけてよい時間。超えたものは失敗扱いにして待たない
+CHECKLIST_EVENT_TIMEOUT_SECONDS = int(
+    os.environ.get("CHECKLIST_EVENT_TIMEOUT_SECONDS", 90)
+)
+
+
+def run_with_worker_pool(
+    items,
+    worker,
+    max_workers: int = CHECKLIST_MAX_WORKERS,
+    timeout: int = CHECKLIST_EVENT_TIMEOUT_SECONDS,
+):
+    """
+    items の各要素に worker(item, deadline) を並列で適用し、結果を集計する。
+    worker はカウンタの dict を返し、キーごとに合算される。None を返した要素はスキップ扱い。
+    1 要素の例外は他の要素に影響させず failed に数える。
+
+    deadline は開始から timeout 秒後の time.monotonic() の値。worker は書き込みの直前に
+    deadline を確認し、過ぎていれば書き込まずに終えること（スレッドは外から止められないため）。
+    deadline を過ぎた要素は timed_out として数え、結果を待たない。
+
+    :return: {"processed", "skipped", "failed", "timed_out", ...worker のカウンタ} の集計
+    """
+    stats = {"processed": 0, "skipped": 0, "failed": 0, "timed_out": 0}
+    deadlines = {}
+
+    def run(index, item):
+        deadline = time.monotonic() + timeout
+        deadlines[index] = deadline
+        return worker(item, deadline)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {
+        executor.submit(run, index, item): (index, item)
+        for index, item in enumerate(items)
+    }
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                _, item = futures[future]
+                try:
+                    result = future.result()
+                except Exception:
+                    logger.exception(f"[{_item_id(item)}] 処理失敗")
+                    stats["failed"] += 1
+                    continue
+                if result is None:
+                    stats["skipped"] += 1
+                    continue
+                stats["processed"] += 1
+                for key, value in result.items():
+                    stats[key] = stats.get(key, 0) + value
+
+            now = time.monotonic()
+            for future in list(pending):
+                index, item = futures[future]
+                deadline = deadlines.get(index)
+                if deadline is not None and now > deadline:
+                    logger.error(f"[{_item_id(item)}] {timeout}秒以内に終わらなかったためタイムアウト")
+                    stats["timed_out"] += 1
+                    pending.discard(future)
+    finally:
+        # タイムアウトした要素の終了を待たずに戻る
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return stats
+
+
+def _item_id(item):
+    return getattr(item, "id", item)
@@ -4,9 +4,12 @@ import os
 import json
 
 from lib.logger_setup import configure_logger
+from lib.checklist_template_cache import get_template_cache_stats
+from lib.gemini_client import get_json_parse_stats
 from lib.firestore_client import get_firestore_client
-from generate_all_item import get_all_records
-from generate_item import generate_item_per_record, update_next_check_due
+from lib.sharding import parse_shard_params
+from generate_all_item import run_daily_batch
+from generate_item import generate_item_per_record
 
 configure_logger()
 logger = logging.getLogger(__name__)
@@ -43,16 +46,29 @@ class RequestHandler(BaseHTTPRequestHandler):
             f"PUTリクエスト受信: パス={self.path}、ヘッダー={self.headers}、ボディ={put_data.decode('utf-8')}"
         )
 
-        records = get_all_records()
-        for snapshot in records:
-            event_ref = snapshot.reference
-            result = generate_item_per_record(event_ref)
-            update_next_check_due(event_ref, result)
+        try:
+            shard_index, shard_count = parse_shard_params(put_data.decode("utf-8"))
+        except ValueError as e:
+            logger.error(f"エラー発生：{str(e)}")
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(f"Error: {str(e)}".encode("utf-8"))
+            return
+
+        try:
+            result = run_daily_batch(shard_index, shard_count)
+        except Exception as e:
+            logger.exception("エラー発生")
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write(f"Error: {str(e)}".encode("utf-8"))
+            return
+        logger.info(f"正常終了: {result}")
 
         self.send_response(200)
-        self.send_header("Content-type", "text/plain")
+        self.send_header("Content-type", "application/json")
         self.end_headers()
-        self.wfile.write(b"PUT OK")
+        self.wfile.write(json.dumps(result).encode("utf-8"))
 
     def do_PATCH(self):
         content_length = int(self.headers.get("Content-Length", 0))
@@ -75,18 +91,23 @@ class RequestHandler(BaseHTTPRequestHandler):
                 .document(event_id)
             )
 
-            if not event_ref.get().exists:
+            # 存在確認と持ち物生成で同じスナップショットを使う
+            event_doc = event_ref.get()
+            if not event_doc.exists:
                 raise ValueError(
                     f"イベントが存在しません: userId:{user_id}, eventId{event_id}"
                 )
 
-            result = generate_item_per_record(event_ref)
-            update_next_check_due(event_ref, result)
+            decision = generate_item_per_record(event_doc)
+            logger.info(f"持ち物テンプレートキャッシュ: {get_template_cache_stats()}")
+            logger.info(f"Gemini応答のJSON解析: {get_json_parse_stats()}")
 
             self.send_response(200)
             self.send_header("Content-type", "application/json")
             self.end_headers()
-            self.wfile.write(json.dumps({"status": "success"}).encode("utf-8"))
+            self.wfile.write(
+                json.dumps({"status": "success", "decision": decision}).encode("utf-8")
+            )
 
         except Exception as e:
             logger.exception("エラー発生")
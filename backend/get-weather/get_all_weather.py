@@ -1,68 +1,147 @@
+from concurrent.futures import Future
 from datetime import datetime, timedelta, timezone
 import json
 import logging
+import threading
 
+from lib.batch_checkpoint import run_resumable_stream
 from lib.firestore_client import (
     get_firestore_client,
     get_query_with_and_filters,
     update_document_weather,
 )
+from lib.forecast_cache import get_forecast_cache_stats
+from lib.geocode_address import get_geocode_cache_stats
+from lib.http_client import HTTP_MAX_IN_FLIGHT
+from lib.pipeline import run_pipeline
 from lib.secret_manager_client import get_openweathermap_api_key
-from lib.weather import fetch_weather_for_document
+from lib.sharding import is_in_shard
+from lib.weather import (
+    fetch_weather_for_cell,
+    get_forecast_rate_limit_stats,
+    get_location_cell,
+)
 
 logger = logging.getLogger()
 
+JST = timezone(timedelta(hours=9))
+DAY_OFFSETS = [0, 2, 4]
 
-def _get_records_for_day_offset(collection_name: str, offset_days: int):
-    JST = timezone(timedelta(hours=9))
-    today = datetime.now(JST).replace(hour=0, minute=0, second=0, microsecond=0)
-    target_day = today + timedelta(days=offset_days)
-    start = target_day
-    end = target_day + timedelta(days=1)
 
-    db = get_firestore_client("hisho-events")
+def _get_records_query(db, today: datetime):
+    # 0〜4日後の範囲を1クエリで取得し、ページングのため start_time 順に並べる
+    start = today + timedelta(days=min(DAY_OFFSETS))
+    end = today + timedelta(days=max(DAY_OFFSETS) + 1)
 
     filters = [
         ("start_time", ">=", start),
         ("start_time", "<", end),
     ]
 
-    query = get_query_with_and_filters(db.collection_group(collection_name), filters)
-
-    return list(query.stream())
-
+    query = get_query_with_and_filters(db.collection_group("events"), filters)
+    return query.order_by("start_time")
 
-def get_all_records():
-    collection_name = "events"
-    offsets = [0, 2, 4]
-    all_records = []
 
-    for offset in offsets:
-        records = _get_records_for_day_offset(collection_name, offset)
-        logger.info(f"--- {offset}日後のレコード ---")
-        all_records.extend(records)
-
-    return all_records
+def run_daily_batch(shard_index: int = 0, shard_count: int = 1):
+    """
+    0/2/4 日後に開始するイベントをページ単位で読み出し、1本のパイプラインで処理する。
+    途中で止まっても再実行で続きから再開する。
+    shard_count > 1 の場合は、ユーザーIDのハッシュが shard_index に当たるイベントのみ処理する。
+    :return: {"status": "done" | "in_progress", "pages", "records"}
+    """
+    today = datetime.now(JST).replace(hour=0, minute=0, second=0, microsecond=0)
+    target_dates = {(today + timedelta(days=offset)).date() for offset in DAY_OFFSETS}
 
+    db = get_firestore_client("hisho-events")
 
-def update_weather_for_records(records):
+    def handle_stream(snapshots, done):
+        def records():
+            # 1日後・3日後のイベントと他シャードのイベントはクライアント側で除外する
+            for snapshot in snapshots:
+                if snapshot.get("start_time").astimezone(JST).date() in target_dates and is_in_shard(
+                    snapshot.reference.parent.parent.id, shard_index, shard_count
+                ):
+                    yield snapshot
+                else:
+                    done(snapshot)
+
+        update_weather_for_records(records(), on_done=done)
+
+    return run_resumable_stream(
+        db,
+        f"get-weather_{shard_index}of{shard_count}",
+        today.date().isoformat(),
+        _get_records_query(db, today),
+        handle_stream,
+    )
+
+
+def update_weather_for_records(records, on_done=None):
+    """
+    :param records: 対象イベントのスナップショット（ジェネレータ可）
+    :param on_done: on_done(doc) は各イベントの処理が終わるたびに呼ばれる
+    """
     api_key = get_openweathermap_api_key()
 
     db = get_firestore_client("hisho-events")
 
-    for doc in records:
-        event_id = doc.id
+    cell_forecasts = _CellForecasts(api_key)
+
+    def process(doc):
+        event = doc.to_dict()
+        forecast = cell_forecasts.get(get_location_cell(event))
+        return _filter_forecast_by_dates(forecast, event.get("start_time"))
+
+    def write(doc, filtered_forecast):
         user_id = doc.reference.parent.parent.id
-        try:
-            forecast = fetch_weather_for_document(doc.to_dict(), api_key)
-            start_time = doc.to_dict().get("start_time")
-            filtered_forecast = _filter_forecast_by_dates(forecast, start_time)
-            update_document_weather(
-                db.collection("users").document(user_id).collection("events"), event_id, filtered_forecast
-            )
-            logger.info(f"{event_id} の天気情報を更新しました")
-        except Exception as e:
-            logger.error(f"{event_id} の処理でエラー発生: {e}")
+        update_document_weather(
+            db.collection("users").document(user_id).collection("events"), doc.id, filtered_forecast
+        )
+        logger.info(f"{doc.id} の天気情報を更新しました")
+
+    # レート制限（60回/分）の範囲内で、取得・天気API・更新を並行させる
+    stats = run_pipeline(
+        records, process, write, workers=HTTP_MAX_IN_FLIGHT, on_done=on_done
+    )
+
+    logger.info(
+        f"天気取得: ユニークセル数={cell_forecasts.cell_count()}, イベント={stats}"
+    )
+    logger.info(f"ジオコードキャッシュ: {get_geocode_cache_stats()}")
+    logger.info(f"天気予報キャッシュ: {get_forecast_cache_stats()}")
+    logger.info(f"レート制限待ち: {get_forecast_rate_limit_stats()}")
+
+
+class _CellForecasts:
+    """
+    1回のバッチ内で、丸めた緯度経度のセルごとに天気予報を1度だけ取得する。
+    同じセルを同時に要求したスレッドは、最初の取得結果を待って共有する。
+    """
+
+    def __init__(self, api_key: str):
+        self._api_key = api_key
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def get(self, cell):
+        with self._lock:
+            future = self._futures.get(cell)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._futures[cell] = future
+
+        if is_owner:
+            try:
+                future.set_result(fetch_weather_for_cell(cell, self._api_key))
+            except Exception as e:
+                logger.error(f"{cell} の天気取得でエラー発生: {e}")
+                future.set_exception(e)
+        return future.result()
+
+    def cell_count(self) -> int:
+        with self._lock:
+            return len(self._futures)
 
 
 def _filter_forecast_by_dates(forecast: dict, start_time: datetime):
@@ -5,8 +5,10 @@ from lib.firestore_client import (
     get_firestore_client,
     update_document_weather,
 )
+from lib.forecast_cache import get_forecast_cache_stats
+from lib.geocode_address import get_geocode_cache_stats
 from lib.secret_manager_client import get_openweathermap_api_key
-from lib.weather import fetch_weather_for_document
+from lib.weather import fetch_weather_for_document, get_forecast_rate_limit_stats
 
 logger = logging.getLogger()
 db = get_firestore_client("hisho-events")
@@ -51,6 +53,9 @@ def update_weather_for_trigger_record(user_id, event_id, record_dict):
             filtered_forecast,
         )
         logger.info(f"{event_id} の天気情報を更新しました")
+        logger.info(f"ジオコードキャッシュ: {get_geocode_cache_stats()}")
+        logger.info(f"天気予報キャッシュ: {get_forecast_cache_stats()}")
+        logger.info(f"レート制限待ち: {get_forecast_rate_limit_stats()}")
     else:
         logger.info(
             "addressもしくはstarttimeが空のため天気情報の取得としませんでした。"
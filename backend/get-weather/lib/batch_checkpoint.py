@@ -0,0 +1,179 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger()
+
+CHECKPOINT_COLLECTION = "batch_checkpoints"
+# 時間予算は各ページの処理前にしか確認しないため、1ページの処理時間がはみ出す分だけ
+# Cloud Run / Workflows のタイムアウトに余裕が必要になる。ページを小さくしてはみ出しを抑える
+BATCH_PAGE_SIZE = int(os.environ.get("BATCH_PAGE_SIZE", 50))
+# 1回のリクエストで新しいページの処理を始めてよい時間（タイムアウト 900 秒に対して十分短くする）
+BATCH_TIME_BUDGET_SECONDS = int(os.environ.get("BATCH_TIME_BUDGET_SECONDS", 240))
+
+
+def run_resumable_batch(db, name: str, run_date: str, query, handle_page):
+    """
+    start_time 順の query を start_after カーソルでページングし、ページごとに handle_page を呼ぶ。
+    同じ start_time のイベントを取りこぼさないよう、ドキュメントのパスを第2キーとして並べる。
+    ページを処理するたびにチェックポイントを保存し、再実行時は続きから再開する。
+    時間予算を使い切った場合は in_progress を返すので、done になるまで呼び直すこと。
+
+    :param name: チェックポイントのキー（バッチ名）
+    :param run_date: 実行日（YYYY-MM-DD）。日付が変わると最初からやり直す
+    :param handle_page: handle_page(snapshots) でそのページのレコードを処理する
+    :return: {"status": "done" | "in_progress", "pages", "records"}
+    """
+    checkpoint_ref = db.collection(CHECKPOINT_COLLECTION).document(f"{name}_{run_date}")
+    checkpoint = _load_checkpoint(checkpoint_ref, run_date)
+    if checkpoint["status"] == "done":
+        logger.info(f"{name} は処理済みです: {run_date}")
+        return _result(checkpoint)
+
+    started = time.monotonic()
+    cursor = _load_cursor(db, checkpoint)
+    query = query.order_by("__name__")
+
+    while time.monotonic() - started < BATCH_TIME_BUDGET_SECONDS:
+        page_query = query.limit(BATCH_PAGE_SIZE)
+        if cursor is not None:
+            page_query = page_query.start_after(cursor)
+        snapshots = list(page_query.stream())
+
+        if snapshots:
+            handle_page(snapshots)
+            cursor = snapshots[-1]
+            checkpoint["cursor_path"] = cursor.reference.path
+            checkpoint["cursor_start_time"] = cursor.get("start_time")
+            checkpoint["pages"] += 1
+            checkpoint["records"] += len(snapshots)
+
+        if len(snapshots) < BATCH_PAGE_SIZE:
+            checkpoint["status"] = "done"
+
+        _save_checkpoint(checkpoint_ref, checkpoint)
+        logger.info(f"{name} チェックポイント保存: {_result(checkpoint)}")
+        if checkpoint["status"] == "done":
+            break
+
+    return _result(checkpoint)
+
+
+def run_resumable_stream(db, name: str, run_date: str, query, handle_stream):
+    """
+    run_resumable_batch と同じページングとチェックポイントを使うが、ページの区切りで処理を止めず、
+    全ページのスナップショットを1つのジェネレータとして handle_stream に渡す。
+    次のページの読み出しを前のページの処理と並行させるためのもの。
+
+    handle_stream は各スナップショットの処理が終わったら（成功・スキップ・失敗を問わず）
+    done(snapshot) を呼ぶこと。あるページのスナップショットがすべて done になり、
+    それより前のページもすべて終わった時点でチェックポイントを進める。
+    時間予算を使い切ると次のページを読み出さなくなり、読み出し済みの分を処理して in_progress を返す。
+
+    :param handle_stream: handle_stream(snapshots, done)
+    :return: {"status": "done" | "in_progress", "pages", "records"}
+    """
+    checkpoint_ref = db.collection(CHECKPOINT_COLLECTION).document(f"{name}_{run_date}")
+    checkpoint = _load_checkpoint(checkpoint_ref, run_date)
+    if checkpoint["status"] == "done":
+        logger.info(f"{name} は処理済みです: {run_date}")
+        return _result(checkpoint)
+
+    started = time.monotonic()
+    query = query.order_by("__name__")
+    lock = threading.Lock()
+    # 読み出し順のページ: {"remaining": 未完了のパス, "cursor", "size", "last"}
+    pages = []
+    page_of = {}
+
+    def advance():
+        # 先頭から連続して終わったページの分だけチェックポイントを進める（lock を持って呼ぶ）
+        while pages and not pages[0]["remaining"]:
+            page = pages.pop(0)
+            if page["cursor"] is not None:
+                checkpoint["cursor_path"] = page["cursor"].reference.path
+                checkpoint["cursor_start_time"] = page["cursor"].get("start_time")
+                checkpoint["pages"] += 1
+                checkpoint["records"] += page["size"]
+            if page["last"]:
+                checkpoint["status"] = "done"
+            _save_checkpoint(checkpoint_ref, checkpoint)
+            logger.info(f"{name} チェックポイント保存: {_result(checkpoint)}")
+
+    def snapshots():
+        cursor = _load_cursor(db, checkpoint)
+        while time.monotonic() - started < BATCH_TIME_BUDGET_SECONDS:
+            page_query = query.limit(BATCH_PAGE_SIZE)
+            if cursor is not None:
+                page_query = page_query.start_after(cursor)
+            page_snapshots = list(page_query.stream())
+            page = {
+                "remaining": {snapshot.reference.path for snapshot in page_snapshots},
+                "cursor": page_snapshots[-1] if page_snapshots else None,
+                "size": len(page_snapshots),
+                "last": len(page_snapshots) < BATCH_PAGE_SIZE,
+            }
+            with lock:
+                pages.append(page)
+                for snapshot in page_snapshots:
+                    page_of[snapshot.reference.path] = page
+                advance()
+
+            yield from page_snapshots
+            if page["last"]:
+                return
+            cursor = page["cursor"]
+
+    def done(snapshot):
+        path = snapshot.reference.path
+        with lock:
+            page = page_of.pop(path, None)
+            if page is None:
+                return
+            page["remaining"].discard(path)
+            advance()
+
+    handle_stream(snapshots(), done)
+    return _result(checkpoint)
+
+
+def _load_checkpoint(checkpoint_ref, run_date: str) -> dict:
+    doc = checkpoint_ref.get()
+    if doc.exists:
+        return doc.to_dict()
+    return {
+        "date": run_date,
+        "status": "in_progress",
+        "cursor_path": None,
+        "cursor_start_time": None,
+        "pages": 0,
+        "records": 0,
+    }
+
+
+def _load_cursor(db, checkpoint: dict):
+    if not checkpoint["cursor_path"]:
+        return None
+    snapshot = db.document(checkpoint["cursor_path"]).get()
+    if snapshot.exists:
+        return snapshot
+    # カーソルのドキュメントが削除されていた場合は、保存した (start_time, パス) の直後から再開する
+    return {
+        "start_time": checkpoint["cursor_start_time"],
+        "__name__": db.document(checkpoint["cursor_path"]),
+    }
+
+
+def _save_checkpoint(checkpoint_ref, checkpoint: dict):
+    checkpoint["updated_at"] = datetime.now(timezone.utc)
+    checkpoint_ref.set(checkpoint)
+
+
+def _result(checkpoint: dict) -> dict:
+    return {
+        "status": checkpoint["status"],
+        "pages": checkpoint["pages"],
+        "records": checkpoint["records"],
+    }
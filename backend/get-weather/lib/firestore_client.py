@@ -1,6 +1,9 @@
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter, BaseCompositeFilter
 
+from .weather_format import encode_weather_info
+from .weather_summary import summarize_forecast
+
 
 def get_firestore_client(database_name: str = "(default)"):
     return firestore.Client(database=database_name)
@@ -17,4 +20,9 @@ def get_query_with_or_filters(collection, filters):
 
 
 def update_document_weather(collection, doc_id: str, forecast: dict):
-    collection.document(doc_id).update({"weather_info": forecast})
+    collection.document(doc_id).update(
+        {
+            "weather_info": encode_weather_info(forecast),
+            "weather_summary": summarize_forecast(forecast),
+        }
+    )
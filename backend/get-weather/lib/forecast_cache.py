@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from .firestore_client import get_firestore_client
+
+logger = logging.getLogger()
+
+# memory: プロセス内のみ / firestore: PUT・PATCH や複数インスタンス間で共有 / none: 無効
+FORECAST_CACHE_BACKEND = os.environ.get("FORECAST_CACHE_BACKEND", "firestore")
+FORECAST_CACHE_COLLECTION = "forecast_cache"
+# 同じ 3 時間枠内でも、これより古いキャッシュは使わない
+FORECAST_CACHE_MAX_AGE_MINUTES = int(
+    os.environ.get("FORECAST_CACHE_MAX_AGE_MINUTES", 180)
+)
+# OpenWeatherMap の予報は 3 時間刻み
+FORECAST_SLOT_HOURS = 3
+
+
+class MemoryForecastCacheBackend:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, forecast: dict, fetched_at: datetime):
+        with self._lock:
+            self._entries[key] = (forecast, fetched_at)
+
+
+class FirestoreForecastCacheBackend:
+    def __init__(self, db):
+        self._collection = db.collection(FORECAST_CACHE_COLLECTION)
+
+    def get(self, key: str):
+        doc = self._collection.document(key).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        return data["forecast"], data["fetched_at"]
+
+    def set(self, key: str, forecast: dict, fetched_at: datetime):
+        self._collection.document(key).set(
+            {
+                "forecast": forecast,
+                "fetched_at": fetched_at,
+                # Firestore の TTL ポリシー対象フィールド
+                "expire_at": fetched_at + timedelta(hours=FORECAST_SLOT_HOURS),
+            }
+        )
+
+
+def _create_backend():
+    if FORECAST_CACHE_BACKEND == "none":
+        return None
+    if FORECAST_CACHE_BACKEND == "memory":
+        return MemoryForecastCacheBackend()
+    return FirestoreForecastCacheBackend(get_firestore_client("hisho-events"))
+
+
+backend = _create_backend()
+_stats = {"hit": 0, "miss": 0}
+_stats_lock = threading.Lock()
+
+
+def get_or_fetch_forecast(cell, fetch):
+    """
+    セルと現在の 3 時間枠をキーにキャッシュを引き、なければ fetch() の結果を保存して返す。
+    """
+    if backend is None:
+        return fetch()
+
+    now = datetime.now(timezone.utc)
+    key = _cache_key(cell, now)
+
+    entry = _safe_get(key)
+    if entry:
+        forecast, fetched_at = entry
+        if now - fetched_at <= timedelta(minutes=FORECAST_CACHE_MAX_AGE_MINUTES):
+            _count("hit")
+            return forecast
+
+    _count("miss")
+    forecast = fetch()
+    _safe_set(key, forecast, now)
+    return forecast
+
+
+def get_forecast_cache_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _cache_key(cell, now: datetime) -> str:
+    lat, lon = cell
+    slot = int(now.timestamp()) // (FORECAST_SLOT_HOURS * 3600)
+    return f"{lat}_{lon}_{slot}"
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _safe_get(key: str):
+    # キャッシュ障害時は API から取得し直せばよいので、例外は握りつぶす
+    try:
+        return backend.get(key)
+    except Exception as e:
+        logger.warning(f"天気予報キャッシュの読み込みに失敗: {e}")
+        return None
+
+
+def _safe_set(key: str, forecast: dict, fetched_at: datetime):
+    try:
+        backend.set(key, forecast, fetched_at)
+    except Exception as e:
+        logger.warning(f"天気予報キャッシュの保存に失敗: {e}")
@@ -1,9 +1,126 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from geopy.extra.rate_limiter import RateLimiter
 from geopy.geocoders import Nominatim
 
+from .firestore_client import get_firestore_client
+
+logger = logging.getLogger()
+
+GEOCODE_CACHE_COLLECTION = "geocode_cache"
+GEOCODE_CACHE_TTL_DAYS = int(os.environ.get("GEOCODE_CACHE_TTL_DAYS", 30))
+GEOCODE_LRU_SIZE = int(os.environ.get("GEOCODE_LRU_SIZE", 1024))
+
+# geopy の RequestsAdapter がセッションを保持するため、インスタンスを使い回す
+geolocator = Nominatim(user_agent="your-app-name", timeout=10)  # 任意の名前でOK
+# Nominatim の利用規約（1秒1リクエスト）を並列実行時も守る
+geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1)
+db = get_firestore_client("hisho-events")
+
+_lru = OrderedDict()
+_lock = threading.Lock()
+_stats = {"lru_hit": 0, "store_hit": 0, "miss": 0}
+
+
+def normalize_address(address: str) -> str:
+    # 全角/半角・大小文字・空白の揺れを吸収する
+    normalized = unicodedata.normalize("NFKC", address).strip().lower()
+    return re.sub(r"\s+", " ", normalized)
+
 
 def geocode_address_nominatim(address: str):
-    geolocator = Nominatim(user_agent="your-app-name")  # 任意の名前でOK
-    location = geolocator.geocode(address)
+    key = normalize_address(address)
+
+    location = _get_from_lru(key)
+    if location:
+        _count("lru_hit")
+        return location
+
+    location = _get_from_store(key)
+    if location:
+        _count("store_hit")
+    else:
+        _count("miss")
+        location = _geocode(key)
+        _save_to_store(key, location)
+
+    _put_to_lru(key, location)
+    return location
+
+
+def get_geocode_cache_stats() -> dict:
+    with _lock:
+        return dict(_stats)
+
+
+def _geocode(address: str):
+    location = geocode(address)
     if not location:
         raise ValueError(f"住所のジオコーディングに失敗しました: {address}")
     return location.latitude, location.longitude
+
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+
+
+def _get_from_lru(key: str):
+    with _lock:
+        location = _lru.get(key)
+        if location:
+            _lru.move_to_end(key)
+        return location
+
+
+def _put_to_lru(key: str, location):
+    with _lock:
+        _lru[key] = location
+        _lru.move_to_end(key)
+        while len(_lru) > GEOCODE_LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def _cache_doc(key: str):
+    doc_id = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return db.collection(GEOCODE_CACHE_COLLECTION).document(doc_id)
+
+
+def _get_from_store(key: str):
+    try:
+        doc = _cache_doc(key).get()
+    except Exception as e:
+        logger.warning(f"ジオコードキャッシュの読み込みに失敗: {e}")
+        return None
+    if not doc.exists:
+        return None
+
+    data = doc.to_dict()
+    expire_at = data.get("expire_at")
+    if not expire_at or expire_at <= datetime.now(timezone.utc):
+        return None
+    return data["lat"], data["lon"]
+
+
+def _save_to_store(key: str, location):
+    now = datetime.now(timezone.utc)
+    try:
+        _cache_doc(key).set(
+            {
+                "address": key,
+                "lat": location[0],
+                "lon": location[1],
+                "cached_at": now,
+                # Firestore の TTL ポリシー対象フィールド
+                "expire_at": now + timedelta(days=GEOCODE_CACHE_TTL_DAYS),
+            }
+        )
+    except Exception as e:
+        logger.warning(f"ジオコードキャッシュの保存に失敗: {e}")
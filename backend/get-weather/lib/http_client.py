@@ -0,0 +1,40 @@
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 同時に投げる外部 API リクエスト数（コネクションプールの大きさも揃える）
+HTTP_MAX_IN_FLIGHT = int(os.environ.get("HTTP_MAX_IN_FLIGHT", 8))
+# (接続, 読み込み) タイムアウト秒
+HTTP_TIMEOUT = (5, 20)
+
+
+def _create_session():
+    # 接続失敗のみここで再試行する。429 / 5xx の再試行は API の呼び出し回数に数えられるため、
+    # 呼び出し側でレート制限のトークンを取り直してから行う
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=0,
+        status=0,
+        backoff_factor=1,
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4, pool_maxsize=HTTP_MAX_IN_FLIGHT, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# keep-alive で TCP/TLS ハンドシェイクを使い回すため、プロセスで1つだけ作る
+session = _create_session()
+
+
+def get_json(url: str, params: dict):
+    response = session.get(url, params=params, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
@@ -0,0 +1,100 @@
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger()
+
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", 8))
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 32))
+
+_DONE = object()
+_SKIPPED = object()
+_FAILED = object()
+
+
+def run_pipeline(
+    records,
+    process,
+    write,
+    workers: int = PIPELINE_WORKERS,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    on_done=None,
+):
+    """
+    レコードの読み出し → process（外部 API 呼び出し）→ write（Firestore 更新）を
+    有界キューでつなぎ、各段を並行に動かす。メモリに載るのはキューに入っている分だけ。
+
+    :param records: スナップショットを順に返すイテラブル（ジェネレータ可）
+    :param process: process(doc) は書き込む値を返す。None ならスキップ扱い
+    :param write: write(doc, value) で結果を保存する。呼び出し元スレッドで直列に実行される
+    :param on_done: on_done(doc) は各レコードの処理が終わるたびに（保存・スキップ・失敗を問わず）
+        呼び出し元スレッドで呼ばれる
+    :return: {"processed", "skipped", "failed"} の集計
+    """
+    process_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+    stats = {"processed": 0, "skipped": 0, "failed": 0}
+    stats_lock = threading.Lock()
+    source_errors = []
+
+    def count(key: str):
+        with stats_lock:
+            stats[key] += 1
+
+    def produce():
+        try:
+            for doc in records:
+                process_queue.put(doc)
+        except Exception as e:
+            logger.exception("レコード取得でエラー発生")
+            source_errors.append(e)
+        finally:
+            for _ in range(workers):
+                process_queue.put(_DONE)
+
+    def work():
+        while True:
+            doc = process_queue.get()
+            if doc is _DONE:
+                write_queue.put(_DONE)
+                return
+            try:
+                value = process(doc)
+            except Exception as e:
+                logger.error(f"{doc.id} の処理でエラー発生: {e}")
+                value = _FAILED
+            write_queue.put((doc, _SKIPPED if value is None else value))
+
+    threads = [threading.Thread(target=produce, daemon=True)]
+    threads += [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    finished = 0
+    while finished < workers:
+        item = write_queue.get()
+        if item is _DONE:
+            finished += 1
+            continue
+        doc, value = item
+        if value is _FAILED:
+            count("failed")
+        elif value is _SKIPPED:
+            count("skipped")
+        else:
+            try:
+                write(doc, value)
+                count("processed")
+            except Exception as e:
+                logger.error(f"{doc.id} の書き込みでエラー発生: {e}")
+                count("failed")
+        if on_done is not None:
+            on_done(doc)
+
+    for thread in threads:
+        thread.join()
+
+    if source_errors:
+        raise source_errors[0]
+    return stats
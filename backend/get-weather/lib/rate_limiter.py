@@ -0,0 +1,214 @@
+import fcntl
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from google.cloud import firestore
+
+from .firestore_client import get_firestore_client
+
+logger = logging.getLogger()
+
+# firestore: 全インスタンスで共有 / file: 同一ホスト上のプロセス間でのみ共有
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "firestore")
+RATE_LIMIT_COLLECTION = "rate_limits"
+RATE_LIMIT_FILE_DIR = os.environ.get("RATE_LIMIT_FILE_DIR", "/tmp")
+# ストアの読み書きが連続でこの回数失敗したら、制限なしで続行する
+RATE_LIMIT_MAX_STORE_ERRORS = int(os.environ.get("RATE_LIMIT_MAX_STORE_ERRORS", 5))
+RATE_LIMIT_BACKOFF_SECONDS = 0.2
+# ストア障害時にプロセス内のバケットで制限する時間（過ぎたら共有ストアを再び試す）
+RATE_LIMIT_FALLBACK_SECONDS = int(os.environ.get("RATE_LIMIT_FALLBACK_SECONDS", 60))
+
+
+class MemoryTokenBucketStore:
+    """
+    バケットの状態をプロセス内に保持する。共有ストアが使えない間の代替。
+    """
+
+    def __init__(self):
+        self._state = None
+        self._lock = threading.Lock()
+
+    def read(self):
+        with self._lock:
+            return self._state
+
+    def update(self, take):
+        with self._lock:
+            new_state, wait = take(self._state)
+            if new_state is not None:
+                self._state = new_state
+            return wait
+
+
+class FileTokenBucketStore:
+    """
+    バケットの状態を JSON ファイルに保存し、flock で排他する。
+    """
+
+    def __init__(self, name: str):
+        self._path = os.path.join(RATE_LIMIT_FILE_DIR, f"rate_limit_{name}.json")
+
+    def read(self):
+        with open(self._path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                f.seek(0)
+                content = f.read()
+                return json.loads(content) if content else None
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def update(self, take):
+        with open(self._path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                state = json.loads(content) if content else None
+                new_state, wait = take(state)
+                if new_state is not None:
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(new_state))
+                    f.flush()
+                return wait
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class FirestoreTokenBucketStore:
+    """
+    バケットの状態を Firestore ドキュメントに保存し、トランザクションで更新する。
+    """
+
+    def __init__(self, name: str, db):
+        self._db = db
+        self._ref = db.collection(RATE_LIMIT_COLLECTION).document(name)
+
+    def read(self):
+        snapshot = self._ref.get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def update(self, take):
+        @firestore.transactional
+        def _run(transaction):
+            snapshot = self._ref.get(transaction=transaction)
+            state = snapshot.to_dict() if snapshot.exists else None
+            new_state, wait = take(state)
+            # トークンが取れなかった場合は書き込まない（ドキュメントの競合を増やさない）
+            if new_state is not None:
+                transaction.set(self._ref, new_state)
+            return wait
+
+        return _run(self._db.transaction())
+
+
+class TokenBucketRateLimiter:
+    """
+    共有ストア上のトークンバケット。acquire() はトークンを1つ取得できるまで待機する。
+    待機中は書き込まずに読み取りだけで待ち時間を計算し、取れそうなときだけトランザクションで取得する。
+    ストアの障害が続いた場合は、取得処理自体を止めないよう、しばらくプロセス内の
+    同じ calls/period のバケットで制限する。
+    """
+
+    def __init__(self, store, calls: int, period: int):
+        self._store = store
+        self._capacity = calls
+        self._rate = calls / period
+        self._fallback_store = MemoryTokenBucketStore()
+        self._fallback_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            "acquired": 0,
+            "waited": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "store_errors": 0,
+            "fallbacks": 0,
+        }
+
+    def acquire(self):
+        started = time.monotonic()
+        errors = 0
+        while True:
+            store = self._current_store()
+            try:
+                wait = self._wait_seconds(store.read())
+                if wait <= 0:
+                    wait = store.update(self._take)
+                errors = 0
+            except Exception as e:
+                errors += 1
+                self._count("store_errors")
+                if errors >= RATE_LIMIT_MAX_STORE_ERRORS:
+                    logger.warning(
+                        f"レート制限ストアの障害が続くため、{RATE_LIMIT_FALLBACK_SECONDS}秒間プロセス内で制限: {e}"
+                    )
+                    self._start_fallback()
+                    errors = 0
+                    continue
+                logger.warning(f"レート制限ストアの読み書きに失敗（再試行 {errors}回目）: {e}")
+                # 競合したリクエスト同士が同時に再試行しないよう、ジッター付きで待つ
+                wait = RATE_LIMIT_BACKOFF_SECONDS * (2 ** (errors - 1)) * random.uniform(0.5, 1.5)
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        self._record(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def _current_store(self):
+        with self._lock:
+            if time.monotonic() < self._fallback_until:
+                return self._fallback_store
+        return self._store
+
+    def _start_fallback(self):
+        with self._lock:
+            self._fallback_until = time.monotonic() + RATE_LIMIT_FALLBACK_SECONDS
+            self._stats["fallbacks"] += 1
+
+    def _take(self, state):
+        now = time.time()
+        tokens = self._tokens(state, now)
+        if tokens >= 1:
+            return {"tokens": tokens - 1, "updated_at": now}, 0
+        return None, (1 - tokens) / self._rate
+
+    def _wait_seconds(self, state) -> float:
+        tokens = self._tokens(state, time.time())
+        return 0 if tokens >= 1 else (1 - tokens) / self._rate
+
+    def _tokens(self, state, now: float) -> float:
+        if state is None:
+            return self._capacity
+        elapsed = max(0.0, now - state["updated_at"])
+        return min(self._capacity, state["tokens"] + elapsed * self._rate)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _record(self, waited: float):
+        with self._lock:
+            self._stats["acquired"] += 1
+            if waited >= 0.01:
+                self._stats["waited"] += 1
+            self._stats["wait_seconds"] = round(self._stats["wait_seconds"] + waited, 3)
+            self._stats["max_wait_seconds"] = round(
+                max(self._stats["max_wait_seconds"], waited), 3
+            )
+
+
+def create_rate_limiter(name: str, calls: int, period: int):
+    if RATE_LIMIT_BACKEND == "file":
+        store = FileTokenBucketStore(name)
+    else:
+        store = FirestoreTokenBucketStore(name, get_firestore_client("hisho-events"))
+    return TokenBucketRateLimiter(store, calls, period)
@@ -1,26 +1,73 @@
+import os
+import random
+import time
+
 import requests
+
+from .forecast_cache import get_or_fetch_forecast
 from .geocode_address import geocode_address_nominatim
-from ratelimit import limits, sleep_and_retry
+from .http_client import get_json
+from .rate_limiter import create_rate_limiter
+
+# 緯度経度を丸める小数点以下の桁数（1 → 約 11km 四方のセル）
+GRID_PRECISION = int(os.environ.get("WEATHER_GRID_PRECISION", 1))
+
+# OpenWeatherMap の無料枠（60回/分）を全インスタンス合計で守る
+forecast_rate_limiter = create_rate_limiter("openweathermap", calls=60, period=60)
+FORECAST_MAX_RETRIES = int(os.environ.get("FORECAST_MAX_RETRIES", 3))
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
 
 
 def _get_forecast(lat: float, lon: float, api_key: str):
     url = "https://api.openweathermap.org/data/2.5/forecast"
     params = {"lat": lat, "lon": lon, "appid": api_key, "units": "metric", "lang": "ja"}
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json()
+    return get_json(url, params)
 
 
-@sleep_and_retry
-@limits(calls=60, period=60)
 def _safe_get_forecast(lat, lon, api_key):
-    return _get_forecast(lat, lon, api_key)
+    """
+    429 / 5xx の場合はジッター付き指数バックオフで再試行する。
+    再試行も API の呼び出しになるため、毎回レート制限のトークンを取り直す
+    """
+    for attempt in range(FORECAST_MAX_RETRIES + 1):
+        forecast_rate_limiter.acquire()
+        try:
+            return _get_forecast(lat, lon, api_key)
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status not in RETRYABLE_STATUS_CODES or attempt == FORECAST_MAX_RETRIES:
+                raise
+            time.sleep(_retry_delay(e.response, attempt))
 
 
-def fetch_weather_for_document(doc, api_key: str):
+def _retry_delay(response, attempt: int) -> float:
+    retry_after = response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return (2**attempt) * random.uniform(0.5, 1.5)
+
+
+def get_location_cell(doc):
+    """
+    イベントの住所をジオコーディングし、丸めた (lat, lon) のセルを返す。住所がなければ None
+    """
     address = doc.get("address")
     if not address:
-        return {}
+        return None
     lat, lon = geocode_address_nominatim(address)
-    forecast = _safe_get_forecast(lat, lon, api_key)
-    return forecast
+    return round(lat, GRID_PRECISION), round(lon, GRID_PRECISION)
+
+
+def fetch_weather_for_cell(cell, api_key: str):
+    if cell is None:
+        return {}
+    lat, lon = cell
+    return get_or_fetch_forecast(cell, lambda: _safe_get_forecast(lat, lon, api_key))
+
+
+def fetch_weather_for_document(doc, api_key: str):
+    return fetch_weather_for_cell(get_location_cell(doc), api_key)
+
+
+def get_forecast_rate_limit_stats() -> dict:
+    return forecast_rate_limiter.stats()
@@ -3,7 +3,8 @@ import os
 import logging
 import json
 from lib.logger_setup import configure_logger
-from get_all_weather import get_all_records, update_weather_for_records
+from lib.sharding import parse_shard_params
+from get_all_weather import run_daily_batch
 from get_trigger_weather import get_trigger_record, update_weather_for_trigger_record
 
 
@@ -35,14 +36,24 @@ class RequestHandler(BaseHTTPRequestHandler):
 
     def do_PUT(self):
         logger.info(f"dailyバッチによるPUTリクエスト受信")
-        records = get_all_records()
-        update_weather_for_records(records)
-        logger.info("正常終了")
+        content_length = int(self.headers.get("Content-Length", 0))
+        put_data = self.rfile.read(content_length).decode("utf-8")
+        try:
+            shard_index, shard_count = parse_shard_params(put_data)
+        except ValueError as e:
+            logger.error(f"エラー発生：{str(e)}")
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(f"Error: {str(e)}".encode("utf-8"))
+            return
+
+        result = run_daily_batch(shard_index, shard_count)
+        logger.info(f"正常終了: {result}")
 
         self.send_response(200)
-        self.send_header("Content-type", "text/plain")
+        self.send_header("Content-type", "application/json")
         self.end_headers()
-        self.wfile.write(b"PUT OK")
+        self.wfile.write(json.dumps(result).encode("utf-8"))
 
     def do_PATCH(self):
         logger.info(f"triggerバッチによるPATCHリクエスト受信")
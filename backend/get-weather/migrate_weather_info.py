@@ -0,0 +1,65 @@
+"""
+保存済みイベントの weather_info を列指向の形式（lib/weather_format.py）に変換する一回限りの移行。
+実行は任意: python migrate_weather_info.py [--dry-run]
+"""
+
+import argparse
+import logging
+
+from lib.firestore_client import get_firestore_client
+from lib.logger_setup import configure_logger
+from lib.weather_format import encode_weather_info, is_compact_weather_info
+from lib.weather_summary import summarize_forecast
+
+logger = logging.getLogger()
+
+# WriteBatch 1 回あたりの書き込み上限
+MIGRATION_BATCH_SIZE = 500
+
+
+def migrate_weather_info(dry_run: bool = False) -> dict:
+    """
+    OpenWeatherMap 形式のまま保存されている weather_info を変換する。
+    weather_summary がないイベントには、変換前の予報から要約も書き込む。
+    :return: {"scanned", "migrated", "skipped"}
+    """
+    db = get_firestore_client("hisho-events")
+    stats = {"scanned": 0, "migrated": 0, "skipped": 0}
+    batch = db.batch()
+    pending = 0
+
+    for doc in db.collection_group("events").select(["weather_info", "weather_summary"]).stream():
+        stats["scanned"] += 1
+        data = doc.to_dict()
+        weather_info = data.get("weather_info")
+        if not weather_info or is_compact_weather_info(weather_info):
+            stats["skipped"] += 1
+            continue
+
+        update = {"weather_info": encode_weather_info(weather_info)}
+        if not data.get("weather_summary"):
+            update["weather_summary"] = summarize_forecast(weather_info)
+        stats["migrated"] += 1
+        if dry_run:
+            continue
+
+        batch.update(doc.reference, update)
+        pending += 1
+        if pending >= MIGRATION_BATCH_SIZE:
+            batch.commit()
+            logger.info(f"weather_info 移行中: {stats}")
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+    logger.info(f"weather_info 移行完了（dry_run={dry_run}）: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    configure_logger()
+    parser = argparse.ArgumentParser(description="weather_info を列指向の形式に移行する")
+    parser.add_argument("--dry-run", action="store_true", help="件数の確認のみで書き込まない")
+    args = parser.parse_args()
+    migrate_weather_info(dry_run=args.dry_run)
@@ -1,3 +1,13 @@
 class ValidationError(Exception):
     """クライアント側のバリデーションエラー用"""
+    pass
+
+
+class GeminiResponseError(Exception):
+    """Gemini の応答から期待した JSON を取り出せなかった"""
+    pass
+
+
+class EventNotFoundError(Exception):
+    """会話から予定を抽出できなかった"""
     pass
\ No newline at end of file
@@ -1,9 +1,12 @@
 import re
 import logging
+import threading
 from google import genai
+from google.genai import types
 import tiktoken
 import json
 from datetime import datetime, timezone, timedelta
+from .exceptions import EventNotFoundError, GeminiResponseError
 from .secret_manager_client import get_gemini_api_key
 
 logger = logging.getLogger(__name__)
@@ -16,23 +19,87 @@ JST = timezone(timedelta(hours=9))
 MAX_TOKENS = 1048576
 RESERVED_TOKENS = 2500  # システム文 + 生成余地を残す
 
+EVENT_SCHEDULE_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING", "nullable": True},
+        "start_time": {"type": "STRING", "nullable": True},
+        "end_time": {"type": "STRING", "nullable": True},
+        "location": {"type": "STRING", "nullable": True},
+    },
+    "required": ["title", "start_time", "end_time", "location"],
+}
 
-def create_text(contents, model=model):
-    response = client.models.generate_content(model=model, contents=contents)
+_json_stats = {"direct": 0, "fallback": 0, "failed": 0}
+_json_stats_lock = threading.Lock()
+
+
+def create_text(contents, model=model, response_schema=None):
+    """
+    :param response_schema: 指定すると JSON モードで呼び出し、応答をこのスキーマに沿わせる
+    """
+    config = None
+    if response_schema is not None:
+        config = types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=response_schema,
+        )
+    response = client.models.generate_content(model=model, contents=contents, config=config)
     return response
 
 
-def extract_json(text: str) -> dict:
+def extract_json(text: str, is_valid=None):
+    """
+    JSON モードの応答はそのまま json.loads し、JSON として読めない場合のみコードブロックや
+    前後の説明文を除いて最初の JSON オブジェクトを読む。
+    :param is_valid: 取り出した値の形を検証する関数（省略時は dict であること）
+    :return: 取り出した値。取り出せないか形が違えば None
+    """
     logger.info(text)
-    match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL)
-    if not match:
-        match = re.search(r"(\{.*?\})", text, re.DOTALL)
-    if match:
-        try:
-            return json.loads(match.group(1))
-        except json.JSONDecodeError as e:
-            logger.warning(f"JSONデコード失敗: {e}")
-    return {"required": [], "optional": []}
+    text = (text or "").strip()
+    try:
+        result = json.loads(text)
+        source = "direct"
+    except json.JSONDecodeError:
+        result = _extract_embedded_json(text)
+        source = "fallback"
+
+    if result is not None and (is_valid or _is_object)(result):
+        _count_json(source)
+        return result
+
+    logger.warning(f"Geminiの応答が期待したJSONの形ではありません: {text[:200]}")
+    _count_json("failed")
+    return None
+
+
+def _extract_embedded_json(text: str):
+    match = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    candidate = match.group(1) if match else text
+    start = candidate.find("{")
+    if start < 0:
+        return None
+    try:
+        # raw_decode は入れ子の JSON も末尾まで正しく読む
+        result, _ = json.JSONDecoder().raw_decode(candidate[start:])
+        return result
+    except json.JSONDecodeError as e:
+        logger.warning(f"JSONデコード失敗: {e}")
+        return None
+
+
+def _is_object(value) -> bool:
+    return isinstance(value, dict)
+
+
+def get_json_parse_stats() -> dict:
+    with _json_stats_lock:
+        return dict(_json_stats)
+
+
+def _count_json(name: str):
+    with _json_stats_lock:
+        _json_stats[name] += 1
 
 
 def extract_event_schedule(chat_history: list[dict]) -> dict:
@@ -45,6 +112,8 @@ def extract_event_schedule(chat_history: list[dict]) -> dict:
       "end_time": "ISO8601形式（JST）",
       "location": "場所"
     }
+    :raises GeminiResponseError: 応答から JSON を取り出せなかった場合
+    :raises EventNotFoundError: タイトルまたは開始日時が抽出できなかった場合
     """
     now = datetime.now(JST)
     today_str = now.strftime("%Y-%m-%d")
@@ -73,6 +142,8 @@ def extract_event_schedule(chat_history: list[dict]) -> dict:
   "end_time": "2025-06-01T14:00:00+09:00",
   "location": "イベントの場所"
 }}
+
+会話の中に予定されているイベントがない場合は、すべての項目を null にしてください。イベントはあるものの、会話から推論できない項目がある場合は、その項目のみ null にしてください。
 """
 
     prompt = [
@@ -81,8 +152,14 @@ def extract_event_schedule(chat_history: list[dict]) -> dict:
     ]
     logger.info(prompt)
 
-    response = create_text(prompt)
-    return extract_json(response.text)
+    response = create_text(prompt, response_schema=EVENT_SCHEDULE_RESPONSE_SCHEMA)
+    result = extract_json(response.text)
+    logger.info(f"Gemini応答のJSON解析: {get_json_parse_stats()}")
+    if result is None:
+        raise GeminiResponseError("Geminiの応答から予定のJSONを取り出せませんでした")
+    if not (result.get("title") and result.get("start_time")):
+        raise EventNotFoundError("会話から予定を見つけられませんでした")
+    return result
 
 
 def estimate_tokens(text: str) -> int:
@@ -6,7 +6,7 @@ from lib.logger_setup import configure_logger
 from lib.http_utils import parse_json_body, respond
 from lib.validators import validate_exact_fields, validate_gemini_messages
 from lib.gemini_client import extract_event_schedule
-from lib.exceptions import ValidationError
+from lib.exceptions import EventNotFoundError, GeminiResponseError, ValidationError
 
 
 # ログ設定
@@ -31,6 +31,14 @@ class RequestHandler(BaseHTTPRequestHandler):
             logger.warning(f"⚠️ Validation error: {ve}")
             respond(self, status=400, body={"error": str(ve)})
 
+        except EventNotFoundError as ne:
+            logger.info(f"予定なし: {ne}")
+            respond(self, status=422, body={"error": str(ne)})
+
+        except GeminiResponseError as ge:
+            logger.warning(f"⚠️ Gemini response error: {ge}")
+            respond(self, status=502, body={"error": str(ge)})
+
         except Exception as e:
             logger.exception("❌ Unexpected server error")
             respond(self, status=500, body={"error": "Internal server error"})
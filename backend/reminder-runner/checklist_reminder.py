@@ -1,6 +1,7 @@
 import logging
 from datetime import datetime, timezone, timedelta
 from firebase_admin import messaging
+from google.cloud.firestore import ArrayRemove
 from lib.firestore_client import (
     get_firestore_client,
     get_user_events_collection,
@@ -9,6 +10,9 @@ from lib.firestore_client import (
 from lib.user_context import get_user_id_from_request
 from lib.firestore_utils import serialize_firestore_dict
 from lib.firebase_auth import firebase_configure
+from lib.batch_writer import BatchWriter
+from lib.fcm_dispatcher import NotificationDispatcher
+from lib.reminder_targets import run_reminder_batch
 
 
 logger = logging.getLogger(__name__)
@@ -50,67 +54,52 @@ def post_checklist_reminder():
     firebase_configure()
 
     today = datetime.now(JST).replace(hour=0, minute=0, second=0, microsecond=0)
-    users_ref = db.collection("users")
-    success_count = 0
-    fail_count = 0
+    writer = BatchWriter(db)
+    dispatcher = NotificationDispatcher()
 
-    for user_doc in users_ref.stream():
-        user_id = user_doc.id
-        user_data = user_doc.to_dict()
-        tokens = user_data.get("fcm_tokens", [])
-        if not tokens:
-            continue
+    def enqueue(user_id: str, tokens: list[str], events: list):
+        return _enqueue_notification(user_id, tokens, events, dispatcher)
 
-        events = _get_pending_events(user_id, today)
-        if not events:
-            continue
+    stats = run_reminder_batch(db, _pending_event_filters(today), enqueue)
+    results, send_stats = dispatcher.send_all()
 
-        tokens, success, fail = _send_fcm(user_id, tokens, events)
-        success_count += success
-        fail_count += fail
+    for user_id, result in results.items():
+        logger.info(f"[{user_id}] 成功={result['success']}, 失敗={result['fail']}")
+        _prune_invalid_tokens(user_id, result["invalid_tokens"], writer)
 
-        if tokens is not None:
-            users_ref.document(user_id).update({"fcm_tokens": tokens})
+    writer.flush()
+    stats.update(send_stats)
+    stats.update(writer.stats())
+    logger.info(f"持ち物リマインダー集計: {stats}")
 
-    return {"status": "push completed", "success": success_count, "fail": fail_count}
+    return {"status": "push completed", **stats}
 
 
-def _get_pending_events(user_id: str, today: datetime):
-    event_query = get_query_with_and_filters(
-        get_user_events_collection(db, user_id),
-        [
-            ("next_check_due", "<=", today),
-            ("start_time", ">=", today),
-        ],
-    )
-    return [serialize_firestore_dict(doc.to_dict()) for doc in event_query.stream()]
+def _pending_event_filters(today: datetime):
+    return [
+        ("next_check_due", "<=", today),
+        ("start_time", ">=", today),
+    ]
 
 
-def _send_fcm(user_id: str, tokens: list[str], events: list[dict]):
-    body = "\n".join([f"・{e['title']}（{e['start_time'][:10]}）" for e in events])
+def _enqueue_notification(
+    user_id: str, tokens: list[str], events: list, dispatcher: NotificationDispatcher
+):
+    events_dict = [serialize_firestore_dict(doc.to_dict()) for doc in events]
+    body = "\n".join([f"・{e['title']}（{e['start_time'][:10]}）" for e in events_dict])
     notification = messaging.Notification(
         title="持ち物の準備を忘れずに 📦",
         body=f"今日から準備すべき予定があります:\n{body}",
     )
-    message = messaging.MulticastMessage(notification=notification, tokens=tokens)
-
-    response = messaging.send_each_for_multicast(message)
-    logger.info(
-        f"[{user_id}] 成功={response.success_count}, 失敗={response.failure_count}"
-    )
+    dispatcher.add(user_id, tokens, notification)
+    return {"messages": len(tokens)}
 
-    if response.failure_count == 0:
-        return tokens, response.success_count, 0
 
-    invalid = [
-        tokens[i]
-        for i, r in enumerate(response.responses)
-        if not r.success
-        and hasattr(r.exception, "code")
-        and r.exception.code == "messaging/registration-token-not-registered"
-    ]
-    updated_tokens = [t for t in tokens if t not in invalid]
-    if invalid:
-        logger.info(f"[{user_id}] 無効トークン削除: {len(invalid)} 件")
-
-    return updated_tokens, response.success_count, response.failure_count
+def _prune_invalid_tokens(user_id: str, invalid: list[str], writer: BatchWriter):
+    # 無効トークンがある場合のみ、そのトークンだけを配列から取り除く
+    if not invalid:
+        return
+    logger.info(f"[{user_id}] 無効トークン削除: {len(invalid)} 件")
+    writer.update(
+        db.collection("users").document(user_id), {"fcm_tokens": ArrayRemove(invalid)}
+    )
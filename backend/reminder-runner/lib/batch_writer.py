@@ -0,0 +1,56 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Firestore の WriteBatch 1 回あたりの書き込み上限
+MAX_BATCH_SIZE = 500
+
+
+class BatchWriter:
+    """
+    Firestore への update を WriteBatch にまとめ、上限件数ごとにコミットする。
+    ワーカースレッドから同時に呼ばれても安全。最後に flush() で残りをコミットすること。
+    """
+
+    def __init__(self, db, max_batch_size: int = MAX_BATCH_SIZE):
+        self._db = db
+        self._max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        self._batch = db.batch()
+        self._pending = 0
+        self.writes = 0
+        self.commits = 0
+
+    def update(self, ref, data: dict):
+        with self._lock:
+            self._batch.update(ref, data)
+            self._pending += 1
+            self.writes += 1
+            full_batch = self._take_batch() if self._pending >= self._max_batch_size else None
+
+        if full_batch is not None:
+            self._commit(full_batch)
+
+    def flush(self):
+        with self._lock:
+            batch = self._take_batch() if self._pending else None
+
+        if batch is not None:
+            self._commit(batch)
+
+    def stats(self) -> dict:
+        return {"writes": self.writes, "commits": self.commits}
+
+    def _take_batch(self):
+        # ロック内で呼ぶこと。溜まったバッチを取り出して新しいバッチに差し替える
+        batch = self._batch
+        self._batch = self._db.batch()
+        self._pending = 0
+        return batch
+
+    def _commit(self, batch):
+        batch.commit()
+        with self._lock:
+            self.commits += 1
+        logger.info(f"WriteBatch コミット: 累計 {self.writes} 件 / {self.commits} 回")
@@ -0,0 +1,81 @@
+import logging
+import threading
+
+from firebase_admin import messaging
+
+from lib.worker_pool import run_with_worker_pool
+
+logger = logging.getLogger(__name__)
+
+# messaging.send_each 1 回あたりのメッセージ上限
+FCM_BATCH_SIZE = 500
+INVALID_TOKEN_CODE = "messaging/registration-token-not-registered"
+
+
+class NotificationDispatcher:
+    """
+    全ユーザー分の通知をトークン単位の messaging.Message として溜め、
+    send_all() で 500 件ずつ send_each する。結果はユーザー単位に集約して返す。
+    """
+
+    def __init__(self, batch_size: int = FCM_BATCH_SIZE):
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+        self._messages = []
+        self._owners = []
+
+    def add(self, user_id: str, tokens: list[str], notification):
+        messages = [
+            messaging.Message(notification=notification, token=token)
+            for token in tokens
+        ]
+        with self._lock:
+            self._messages.extend(messages)
+            self._owners.extend((user_id, token) for token in tokens)
+
+    def send_all(self):
+        """
+        :return: (ユーザーごとの {"success", "fail", "invalid_tokens"}, 全体の集計)
+            送信リクエスト自体が失敗したチャンクのユーザーは結果に含まれない
+        """
+        results = {}
+        results_lock = threading.Lock()
+
+        def send_chunk(start: int):
+            end = start + self._batch_size
+            response = messaging.send_each(self._messages[start:end])
+            with results_lock:
+                for (user_id, token), r in zip(self._owners[start:end], response.responses):
+                    result = results.setdefault(
+                        user_id, {"success": 0, "fail": 0, "invalid_tokens": []}
+                    )
+                    if r.success:
+                        result["success"] += 1
+                        continue
+                    result["fail"] += 1
+                    if _is_invalid_token(r.exception):
+                        result["invalid_tokens"].append(token)
+            return {
+                "success": response.success_count,
+                "fail": response.failure_count,
+                "fcm_calls": 1,
+            }
+
+        stats = {"success": 0, "fail": 0, "fcm_calls": 0}
+        chunk_stats = run_with_worker_pool(
+            range(0, len(self._messages), self._batch_size), send_chunk
+        )
+        for key in stats:
+            stats[key] += chunk_stats.get(key, 0)
+        stats["fcm_errors"] = chunk_stats["errors"]
+
+        logger.info(
+            f"FCM送信: メッセージ={len(self._messages)}, ユーザー={len(results)}, {stats}"
+        )
+        return results, stats
+
+
+def _is_invalid_token(exception) -> bool:
+    if isinstance(exception, messaging.UnregisteredError):
+        return True
+    return hasattr(exception, "code") and exception.code == INVALID_TOKEN_CODE
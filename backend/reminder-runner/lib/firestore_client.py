@@ -37,3 +37,22 @@ def get_event_checklist_collection(db, user_id: str, event_id: str):
 # 単一チェックリスト項目のドキュメント参照
 def get_event_checklist_item(db, user_id: str, event_id: str, item_id: str):
     return get_event_checklist_collection(db, user_id, event_id).document(item_id)
+
+
+# collection group クエリの結果を親ユーザーIDごとにまとめる
+def get_events_by_user(db, filters) -> dict:
+    query = get_query_with_and_filters(db.collection_group("events"), filters)
+    events_by_user = {}
+    for snapshot in query.stream():
+        user_id = snapshot.reference.parent.parent.id
+        events_by_user.setdefault(user_id, []).append(snapshot)
+    return events_by_user
+
+
+# ユーザードキュメントを get_all でまとめて取得
+def get_user_docs(db, user_ids, field_paths=None, chunk_size: int = 100):
+    refs = [db.collection("users").document(user_id) for user_id in user_ids]
+    for i in range(0, len(refs), chunk_size):
+        for doc in db.get_all(refs[i : i + chunk_size], field_paths=field_paths):
+            if doc.exists:
+                yield doc
@@ -0,0 +1,65 @@
+import logging
+import os
+
+from lib.firestore_client import (
+    get_events_by_user,
+    get_query_with_and_filters,
+    get_user_docs,
+    get_user_events_collection,
+)
+from lib.worker_pool import run_with_worker_pool
+
+logger = logging.getLogger(__name__)
+
+# collection_group: 通知対象イベントを1クエリで取得し、該当ユーザーのみ読む
+# per_user: 全ユーザーを走査してユーザーごとにクエリする（従来方式）
+QUERY_MODE = os.environ.get("REMINDER_QUERY_MODE", "collection_group")
+
+
+def run_reminder_batch(db, filters, send):
+    """
+    filters に該当するイベントを持つユーザーごとに send(user_id, tokens, events) を並列実行する。
+
+    :param filters: events に対する (field, op, value) のリスト
+    :param send: ユーザー単位の通知の登録処理。NotificationDispatcher に積んだ件数を
+        {"messages": int} で返す（送信結果の success / fail は NotificationDispatcher.send_all が返す）
+    :return: run_with_worker_pool の集計結果に query_mode を加えたもの
+    """
+    if QUERY_MODE == "per_user":
+        stats = _run_per_user(db, filters, send)
+    else:
+        stats = _run_collection_group(db, filters, send)
+    return {"query_mode": QUERY_MODE, **stats}
+
+
+def _run_per_user(db, filters, send):
+    def worker(user_doc):
+        tokens = user_doc.to_dict().get("fcm_tokens", [])
+        if not tokens:
+            return None
+
+        events = list(
+            get_query_with_and_filters(
+                get_user_events_collection(db, user_doc.id), filters
+            ).stream()
+        )
+        if not events:
+            return None
+
+        return send(user_doc.id, tokens, events)
+
+    return run_with_worker_pool(db.collection("users").stream(), worker)
+
+
+def _run_collection_group(db, filters, send):
+    events_by_user = get_events_by_user(db, filters)
+    logger.info(f"通知対象ユーザー数: {len(events_by_user)}")
+
+    def worker(user_doc):
+        tokens = user_doc.to_dict().get("fcm_tokens", [])
+        if not tokens:
+            return None
+        return send(user_doc.id, tokens, events_by_user[user_doc.id])
+
+    user_docs = get_user_docs(db, events_by_user.keys(), field_paths=["fcm_tokens"])
+    return run_with_worker_pool(user_docs, worker)
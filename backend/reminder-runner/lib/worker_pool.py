@@ -0,0 +1,42 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+# 同時に処理するユーザー数の上限（Cloud Run の環境変数で調整可能）
+DEFAULT_MAX_WORKERS = int(os.environ.get("REMINDER_MAX_WORKERS", 16))
+
+
+def run_with_worker_pool(items, worker, max_workers: int = DEFAULT_MAX_WORKERS):
+    """
+    items の各要素に worker を並列で適用し、結果を集計する。
+
+    worker はカウンタの dict（例: {"success": int, "fail": int}）を返し、キーごとに合算される。
+    None を返した要素はスキップ扱い。
+    1 要素の例外は他の要素に影響させず、errors としてカウントする。
+
+    :return: {"processed", "skipped", "errors", ...worker のカウンタ} の集計結果
+    """
+    stats = {"processed": 0, "skipped": 0, "errors": 0}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(worker, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                result = future.result()
+            except Exception:
+                logger.exception(f"[{getattr(item, 'id', item)}] 処理失敗")
+                stats["errors"] += 1
+                continue
+
+            if result is None:
+                stats["skipped"] += 1
+                continue
+
+            stats["processed"] += 1
+            for key, value in result.items():
+                stats[key] = stats.get(key, 0) + value
+
+    return stats
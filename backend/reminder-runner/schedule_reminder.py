@@ -1,13 +1,13 @@
 import logging
 from datetime import datetime, timezone, timedelta
 from firebase_admin import messaging
-from lib.firestore_client import (
-    get_firestore_client,
-    get_user_events_collection,
-    get_query_with_and_filters,
-)
+from google.cloud.firestore import ArrayRemove
+from lib.firestore_client import get_firestore_client
 from lib.firestore_utils import serialize_firestore_dict
 from lib.firebase_auth import firebase_configure
+from lib.batch_writer import BatchWriter
+from lib.fcm_dispatcher import NotificationDispatcher
+from lib.reminder_targets import run_reminder_batch
 
 
 logger = logging.getLogger(__name__)
@@ -19,70 +19,58 @@ def post_schedule_reminder():
     firebase_configure()
 
     today = datetime.now(JST).replace(hour=0, minute=0, second=0, microsecond=0)
-    users_ref = db.collection("users")
-    success_count = 0
-    fail_count = 0
+    writer = BatchWriter(db)
+    dispatcher = NotificationDispatcher()
+    events_by_user = {}
 
-    for user_doc in users_ref.stream():
-        user_id = user_doc.id
-        user_data = user_doc.to_dict()
-        tokens = user_data.get("fcm_tokens", [])
-        if not tokens:
-            continue
+    def enqueue(user_id: str, tokens: list[str], events: list):
+        events_by_user[user_id] = events
+        return _enqueue_notification(user_id, tokens, events, dispatcher)
 
-        events_dict, events = _get_pending_events(user_id, today)
-        if not events_dict:
-            continue
+    stats = run_reminder_batch(db, _pending_event_filters(today), enqueue)
+    results, send_stats = dispatcher.send_all()
 
-        tokens, success, fail = _send_fcm(user_id, tokens, events_dict, events)
-        success_count += success
-        fail_count += fail
+    for user_id, result in results.items():
+        events = events_by_user[user_id]
+        logger.info(f"[{user_id}] 成功={result['success']}, 失敗={result['fail']}")
 
-        if tokens is not None:
-            users_ref.document(user_id).update({"fcm_tokens": tokens})
+        for event in events:
+            writer.update(event.reference, {"notification_sented": True})
+        _prune_invalid_tokens(user_id, result["invalid_tokens"], writer)
 
-    return {"status": "push completed", "success": success_count, "fail": fail_count}
+    writer.flush()
+    stats.update(send_stats)
+    stats.update(writer.stats())
+    logger.info(f"スケジュールリマインダー集計: {stats}")
 
+    return {"status": "push completed", **stats}
 
-def _get_pending_events(user_id: str, today: datetime):
-    events = get_query_with_and_filters(
-        get_user_events_collection(db, user_id),
-        [
-            ("notification_sented", "==", False),
-            ("notify_at", "<=", today),
-        ],
-    ).stream()
-    return [serialize_firestore_dict(doc.to_dict()) for doc in events], events
+
+def _pending_event_filters(today: datetime):
+    return [
+        ("notification_sented", "==", False),
+        ("notify_at", "<=", today),
+    ]
 
 
-def _send_fcm(user_id: str, tokens: list[str], events_dict: list[dict], events: list):
+def _enqueue_notification(
+    user_id: str, tokens: list[str], events: list, dispatcher: NotificationDispatcher
+):
+    events_dict = [serialize_firestore_dict(doc.to_dict()) for doc in events]
     body = "\n".join([f"・{e['title']}（{e['start_time'][:10]}）" for e in events_dict])
     notification = messaging.Notification(
         title="予定の通知 ✅️",
         body=f"直近の予定をお送りします:\n{body}",
     )
-    message = messaging.MulticastMessage(notification=notification, tokens=tokens)
-
-    response = messaging.send_each_for_multicast(message)
-    logger.info(
-        f"[{user_id}] 成功={response.success_count}, 失敗={response.failure_count}"
-    )
+    dispatcher.add(user_id, tokens, notification)
+    return {"messages": len(tokens)}
 
-    for event in events:
-        event.reference.update({"notification_sented": True})
 
-    if response.failure_count == 0:
-        return tokens, response.success_count, 0
-
-    invalid = [
-        tokens[i]
-        for i, r in enumerate(response.responses)
-        if not r.success
-        and hasattr(r.exception, "code")
-        and r.exception.code == "messaging/registration-token-not-registered"
-    ]
-    updated_tokens = [t for t in tokens if t not in invalid]
-    if invalid:
-        logger.info(f"[{user_id}] 無効トークン削除: {len(invalid)} 件")
-
-    return updated_tokens, response.success_count, response.failure_count
+def _prune_invalid_tokens(user_id: str, invalid: list[str], writer: BatchWriter):
+    # 無効トークンがある場合のみ、そのトークンだけを配列から取り除く
+    if not invalid:
+        return
+    logger.info(f"[{user_id}] 無効トークン削除: {len(invalid)} 件")
+    writer.update(
+        db.collection("users").document(user_id), {"fcm_tokens": ArrayRemove(invalid)}
+    )
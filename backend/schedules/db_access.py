@@ -1,6 +1,8 @@
 import google.cloud.firestore
 from google.cloud.firestore_v1.base_query import FieldFilter, BaseCompositeFilter
 
+from weather_format import decode_weather_info
+
 
 def get_schedules_by_user_and_period(user_id, start_time, end_time):
     db = google.cloud.firestore.Client(database="hisho-events")
@@ -18,4 +20,11 @@ def get_schedules_by_user_and_period(user_id, start_time, end_time):
         .stream()
     )
 
-    return [{"id": doc.id, **doc.to_dict()} for doc in result]
+    records = []
+    for doc in result:
+        record = {"id": doc.id, **doc.to_dict()}
+        # weather_info は列指向の形式で保存されているため、OpenWeatherMap 形式に戻して返す
+        if record.get("weather_info"):
+            record["weather_info"] = decode_weather_info(record["weather_info"])
+        records.append(record)
+    return records
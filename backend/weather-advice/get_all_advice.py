@@ -1,60 +1,132 @@
 from datetime import datetime, timedelta, timezone
 import logging
 import json
+import threading
+import time
 from lib.firestore_client import (
     get_firestore_client, 
     get_query_with_and_filters, 
     update_document_advice,
 )
-from lib.advice import generate_weather_advice
+from lib.advice import (
+    ADVICE_BATCH_SIZE,
+    ADVICE_MAX_IN_FLIGHT,
+    compute_advice_hash,
+    generate_weather_advice_batch,
+    is_failed_advice,
+)
+from lib.metrics import LatencyRecorder
+from lib.pipeline import run_pipeline
+from lib.sharding import is_in_shard
+from lib.weather_summary import get_weather_text
 
 logger = logging.getLogger()
 
-def _get_records_for_day_offset(collection_name: str, offset_days: int):
+DAY_OFFSETS = [0, 2, 4]
+
+def get_all_records(shard_index: int = 0, shard_count: int = 1):
+    """
+    0/2/4 日後に開始するイベントを1回のクエリで取得し、順次 yield する。
+    期間全体（5 日分）を検索して対象外の日をクライアント側で除外する。
+    shard_count > 1 の場合は、ユーザーIDのハッシュが shard_index に当たるイベントのみ返す。
+    """
     JST = timezone(timedelta(hours=9))
     today = datetime.now(JST).replace(hour=0, minute=0, second=0, microsecond=0)
-    target_day = today + timedelta(days=offset_days)
-    start = target_day
-    end = target_day + timedelta(days=1)
+    start = today + timedelta(days=min(DAY_OFFSETS))
+    end = today + timedelta(days=max(DAY_OFFSETS) + 1)
+    target_dates = {(today + timedelta(days=offset)).date() for offset in DAY_OFFSETS}
 
     db = get_firestore_client("hisho-events")
     filters = [
         ("start_time", ">=", start),
         ("start_time", "<", end),
     ]
-    query = get_query_with_and_filters(db.collection_group(collection_name), filters)
-    return list(query.stream())
-
-def get_all_records():
-    collection_name = "events"
-    offsets = [0, 2, 4]
-    all_records = []
-    for offset in offsets:
-        records = _get_records_for_day_offset(collection_name, offset)
-        logger.info(f"--- {offset}日後のレコード ---")
-        all_records.extend(records)
-    return all_records
+    query = get_query_with_and_filters(db.collection_group("events"), filters)
+    count = 0
+    for snapshot in query.stream():
+        if snapshot.get("start_time").astimezone(JST).date() not in target_dates:
+            continue
+        if not is_in_shard(snapshot.reference.parent.parent.id, shard_index, shard_count):
+            continue
+        count += 1
+        yield snapshot
+
+    logger.info(f"--- {DAY_OFFSETS}日後のレコード: {count} 件 ---")
+
+class _EventBatch:
+    """
+    1回のGemini呼び出しでまとめて処理するイベントの組
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.id = ",".join(doc.id for doc in docs)
+
+def _batched(records, size: int):
+    docs = []
+    for doc in records:
+        docs.append(doc)
+        if len(docs) >= size:
+            yield _EventBatch(docs)
+            docs = []
+    if docs:
+        yield _EventBatch(docs)
 
 def update_advice_for_records(records):
     db = get_firestore_client("hisho-events")
-    for doc in records:
-        event_id = doc.id
-        user_id = doc.reference.parent.parent.id
-        try:
+    latency = LatencyRecorder()
+    unchanged = {"count": 0}
+    unchanged_lock = threading.Lock()
+
+    def process(batch):
+        targets = []
+        for doc in batch.docs:
             obj = doc.to_dict()
-            weather_info = obj.get("weather_info")
+            weather_info = get_weather_text(obj)
             schedule_info = obj.get("title")
-            location = obj.get("location")
-            start_time = obj.get("start_time")
-            end_time = obj.get("end_time")
+            if not (weather_info and schedule_info):
+                logger.info(f"{doc.id} はweather_infoまたはtitle,location,timeがないためスキップ")
+                continue
+            inputs = {
+                "weather_info": weather_info,
+                "schedule_info": schedule_info,
+                "location": obj.get("location"),
+                "start_time": obj.get("start_time"),
+                "end_time": obj.get("end_time"),
+            }
+            advice_hash = compute_advice_hash(**inputs)
+            if obj.get("weather_advice") and obj.get("weather_advice_hash") == advice_hash:
+                logger.info(f"{doc.id} は前回から入力が変わっていないためスキップ")
+                with unchanged_lock:
+                    unchanged["count"] += 1
+                continue
+            targets.append((doc, inputs, advice_hash))
+        if not targets:
+            return None
 
-            if weather_info and schedule_info:
-                advice = generate_weather_advice(weather_info, schedule_info, location, start_time, end_time)
+        started = time.monotonic()
+        advices = generate_weather_advice_batch([inputs for _, inputs, _ in targets])
+        latency.record(time.monotonic() - started)
+        return [
+            (doc, advice, None if is_failed_advice(advice) else advice_hash)
+            for (doc, _, advice_hash), advice in zip(targets, advices)
+        ]
+
+    def write(batch, results):
+        for doc, advice, advice_hash in results:
+            user_id = doc.reference.parent.parent.id
+            try:
                 update_document_advice(
-                    db.collection("users").document(user_id).collection("events"), event_id, advice
+                    db.collection("users").document(user_id).collection("events"), doc.id, advice, advice_hash
                 )
-                logger.info(f"{event_id} の天気アドバイスを更新しました")
-            else:
-                logger.info(f"{event_id} はweather_infoまたはtitle,location,timeがないためスキップ")
-        except Exception as e:
-            logger.error(f"{event_id} の処理でエラー発生: {e}")
\ No newline at end of file
+                logger.info(f"{doc.id} の天気アドバイスを更新しました")
+            except Exception as e:
+                logger.error(f"{doc.id} の書き込みでエラー発生: {e}")
+
+    # ADVICE_BATCH_SIZE 件ずつ1つのプロンプトにまとめ、組ごとに並行して生成する
+    stats = run_pipeline(
+        _batched(records, ADVICE_BATCH_SIZE), process, write, workers=ADVICE_MAX_IN_FLIGHT
+    )
+    logger.info(f"天気アドバイス集計（{ADVICE_BATCH_SIZE}件単位）: {stats}")
+    logger.info(f"入力が変わらずスキップしたイベント: {unchanged['count']} 件")
+    logger.info(f"Gemini レイテンシ: {latency.summary()}")
\ No newline at end of file
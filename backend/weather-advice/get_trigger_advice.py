@@ -1,6 +1,7 @@
 import logging
 from lib.firestore_client import get_firestore_client, update_document_advice
-from lib.advice import generate_weather_advice
+from lib.advice import compute_advice_hash, generate_weather_advice, is_failed_advice
+from lib.weather_summary import get_weather_text
 
 logger = logging.getLogger()
 db = get_firestore_client("hisho-events")
@@ -20,17 +21,22 @@ def get_trigger_record(user_id, event_id):
     return record_dict
 
 def update_advice_for_trigger_record(user_id, event_id, record_dict):
-    weather_info = record_dict.get("weather_info")
+    weather_info = get_weather_text(record_dict)
     schedule_info = record_dict.get("title")
     location = record_dict.get("location")
     start_time = record_dict.get("start_time")
     end_time = record_dict.get("end_time")
     if weather_info and schedule_info:
+        advice_hash = compute_advice_hash(weather_info, schedule_info, location, start_time, end_time)
+        if record_dict.get("weather_advice") and record_dict.get("weather_advice_hash") == advice_hash:
+            logger.info(f"{event_id} は前回から入力が変わっていないためアドバイス生成をスキップ")
+            return
         advice = generate_weather_advice(weather_info, schedule_info, location, start_time, end_time)
         update_document_advice(
             db.collection("users").document(user_id).collection("events"),
             event_id,
             advice,
+            None if is_failed_advice(advice) else advice_hash,
         )
         logger.info(f"{event_id} の天気アドバイスを更新しました")
     else:
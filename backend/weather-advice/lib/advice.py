@@ -1,12 +1,31 @@
-import requests
+import hashlib
+import json
+import os
+import random
+import re
+import time
 from google import genai
+from google.genai import errors, types
 from .secret_manager_client import get_gemini_api_key
 import logging
 
 logger = logging.getLogger()
 
+# 同時に投げる Gemini リクエスト数
+ADVICE_MAX_IN_FLIGHT = int(os.environ.get("ADVICE_MAX_IN_FLIGHT", 8))
+# 1つのプロンプトにまとめるイベント数（1 なら従来どおり1件ずつ）
+ADVICE_BATCH_SIZE = int(os.environ.get("ADVICE_BATCH_SIZE", 5))
+GEMINI_TIMEOUT_SECONDS = int(os.environ.get("GEMINI_TIMEOUT_SECONDS", 30))
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", 3))
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# プロンプトを変更したら上げる（既存のキャッシュを無効にするため）
+ADVICE_PROMPT_VERSION = 2
+FAILED_ADVICE_PREFIXES = ("天気アドバイスを取得できませんでした", "天気アドバイス生成に失敗しました")
+
 get_gemini_api_key()
-client = genai.Client()
+client = genai.Client(
+    http_options=types.HttpOptions(timeout=GEMINI_TIMEOUT_SECONDS * 1000)
+)
 model = "gemini-2.0-flash"
 
 def build_prompt(weather_info, schedule_info, location, start_time, end_time):
@@ -35,9 +54,7 @@ def generate_weather_advice(weather_info, schedule_info, location, start_time, e
     prompt = build_prompt(weather_info, schedule_info, location, start_time, end_time)
 
     try:
-        response = client.models.generate_content(
-            model=model, contents=prompt
-        )
+        response = _generate_content_with_retry(prompt)
 
         if response.text:
             advice = response.text.strip()
@@ -47,4 +64,119 @@ def generate_weather_advice(weather_info, schedule_info, location, start_time, e
 
     except Exception as e:
         logger.error(f"Gemini API error (SDK): {e}")
-        return "天気アドバイス生成に失敗しました"
\ No newline at end of file
+        return "天気アドバイス生成に失敗しました"
+
+def compute_advice_hash(weather_info, schedule_info, location, start_time, end_time):
+    """
+    プロンプトの入力を正規化してハッシュ化する。前回と同じならアドバイスを再生成しない
+    """
+    normalized = json.dumps(
+        {
+            "version": ADVICE_PROMPT_VERSION,
+            "weather_info": weather_info,
+            "schedule_info": schedule_info,
+            "location": location,
+            "start_time": start_time.isoformat() if start_time else None,
+            "end_time": end_time.isoformat() if end_time else None,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def is_failed_advice(advice: str) -> bool:
+    return advice.startswith(FAILED_ADVICE_PREFIXES)
+
+def build_batch_prompt(events):
+    """
+    複数イベント分のアドバイスを1回で生成するプロンプトを組み立てる。
+    各イベントは event_1, event_2, ... のIDで区別する
+    """
+    event_sections = "".join(
+        f"【イベントID】\nevent_{i}\n"
+        f"【スケジュール情報】\n{event['schedule_info']}\n"
+        f"【天気情報】\n{event['weather_info']}\n"
+        f"【場所】\n{event['location']}\n"
+        f"【開始時間】\n{event['start_time']}\n"
+        f"【終了時間】\n{event['end_time']}\n\n"
+        for i, event in enumerate(events, start=1)
+    )
+    prompt = (
+        "あなたは予定プランナーです。"
+        "次の各スケジュールについて、スケジュールと天気情報を考慮して、当日を楽しめるよう日本語で1文程度で短いアドバイスを作成してください。\n"
+        "【アドバイスの例】\n・雨が強すぎるので、水族館や映画館に行くのはいかがでしょうか。\n"
+        "・絶好の動物園日和ですね。日焼け対策と水分補給を忘れずに。\n"
+        "・雨の可能性が高いので、降りだしたら近くの〇〇カフェで雨宿りするのがおすすめです。\n"
+        "【出力形式】\n次のようなJSON配列のみを返してください（説明文なし）:\n"
+        '[{"event_id": "event_1", "advice": "アドバイス"}]\n\n'
+        f"{event_sections}"
+    )
+    return prompt
+
+def generate_weather_advice_batch(events):
+    """
+    複数イベントのアドバイスを1回のGemini呼び出しでまとめて生成する。
+    応答に含まれなかったイベントは1件ずつの呼び出しで補う。
+    :param events: generate_weather_advice の引数を持つ dict のリスト
+    :return: events と同じ順のアドバイスのリスト
+    """
+    if len(events) == 1:
+        return [generate_weather_advice(**events[0])]
+
+    expected_ids = {f"event_{i}" for i in range(1, len(events) + 1)}
+    try:
+        response = _generate_content_with_retry(
+            build_batch_prompt(events),
+            config=types.GenerateContentConfig(response_mime_type="application/json"),
+        )
+        advice_by_id = _parse_batch_advice(response.text or "", expected_ids)
+    except Exception as e:
+        logger.error(f"Gemini API error (SDK, batch): {e}")
+        advice_by_id = {}
+
+    missing = len(expected_ids) - len(advice_by_id)
+    if missing:
+        logger.warning(f"まとめて生成できなかった {missing} 件を個別に生成します")
+
+    return [
+        advice_by_id.get(f"event_{i}") or generate_weather_advice(**event)
+        for i, event in enumerate(events, start=1)
+    ]
+
+def _parse_batch_advice(text: str, expected_ids: set) -> dict:
+    # ```json ... ``` で囲まれていても読めるようにする
+    text = re.sub(r"^\s*```(?:json)?|```\s*$", "", text.strip())
+    try:
+        items = json.loads(text)
+    except json.JSONDecodeError as e:
+        logger.warning(f"JSONデコード失敗: {e}")
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    advice_by_id = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        event_id = item.get("event_id")
+        advice = item.get("advice")
+        if event_id in expected_ids and isinstance(advice, str) and advice.strip():
+            advice_by_id[event_id] = advice.strip()
+    return advice_by_id
+
+def _generate_content_with_retry(prompt, config=None):
+    """
+    429 / 5xx の場合はジッター付き指数バックオフで再試行する
+    """
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        try:
+            return client.models.generate_content(
+                model=model, contents=prompt, config=config
+            )
+        except errors.APIError as e:
+            if e.code not in RETRYABLE_STATUS_CODES or attempt == GEMINI_MAX_RETRIES:
+                raise
+            delay = random.uniform(0, min(30, 2 ** attempt))
+            logger.warning(f"Gemini API {e.code} のため {delay:.1f} 秒後に再試行します（{attempt + 1}回目）")
+            time.sleep(delay)
\ No newline at end of file
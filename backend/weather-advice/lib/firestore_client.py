@@ -12,5 +12,8 @@ def get_query_with_or_filters(collection, filters):
     field_filters = [FieldFilter(field, op, val) for field, op, val in filters]
     return collection.where(filter=BaseCompositeFilter("OR", field_filters))
 
-def update_document_advice(collection, doc_id: str, advice: str):
-    collection.document(doc_id).update({"weather_advice": advice})
\ No newline at end of file
+def update_document_advice(collection, doc_id: str, advice: str, advice_hash: str = None):
+    # advice_hash は生成に使った入力のハッシュ。失敗時は None にして次回再生成させる
+    collection.document(doc_id).update(
+        {"weather_advice": advice, "weather_advice_hash": advice_hash}
+    )
\ No newline at end of file
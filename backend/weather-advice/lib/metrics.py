@@ -0,0 +1,33 @@
+import threading
+import time
+
+class LatencyRecorder:
+    """
+    外部 API 呼び出しのレイテンシを記録し、スループットと p50/p95 を集計する。
+    """
+
+    def __init__(self):
+        self._latencies = []
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def summary(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        elapsed = time.monotonic() - self._started
+        return {
+            "calls": len(latencies),
+            "throughput_per_sec": round(len(latencies) / elapsed, 3) if elapsed > 0 else 0,
+            "p50_ms": _percentile_ms(latencies, 50),
+            "p95_ms": _percentile_ms(latencies, 95),
+        }
+
+def _percentile_ms(sorted_values: list[float], percentile: int):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))
+    return round(sorted_values[index] * 1000)
@@ -3,6 +3,7 @@ import logging
 import os
 import json
 from lib.logger_setup import configure_logger
+from lib.sharding import parse_shard_params
 from get_all_advice import get_all_records, update_advice_for_records
 from get_trigger_advice import get_trigger_record, update_advice_for_trigger_record
 
@@ -33,7 +34,18 @@ class RequestHandler(BaseHTTPRequestHandler):
 
     def do_PUT(self):
         logger.info(f"dailyバッチによるPUTリクエスト受信")
-        records = get_all_records()
+        content_length = int(self.headers.get("Content-Length", 0))
+        put_data = self.rfile.read(content_length).decode("utf-8")
+        try:
+            shard_index, shard_count = parse_shard_params(put_data)
+        except ValueError as e:
+            logger.error(f"エラー発生：{str(e)}")
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(f"Error: {str(e)}".encode("utf-8"))
+            return
+
+        records = get_all_records(shard_index, shard_count)
         update_advice_for_records(records)
         logger.info("正常終了")
 